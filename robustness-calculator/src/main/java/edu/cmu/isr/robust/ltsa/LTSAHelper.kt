@@ -29,6 +29,7 @@ import com.fasterxml.jackson.annotation.JsonProperty
 import com.fasterxml.jackson.module.kotlin.jacksonObjectMapper
 import com.fasterxml.jackson.module.kotlin.readValue
 import com.github.ajalt.clikt.core.CliktCommand
+import com.github.ajalt.clikt.core.CliktError
 import com.github.ajalt.clikt.core.PrintMessage
 import com.github.ajalt.clikt.core.subcommands
 import com.github.ajalt.clikt.parameters.arguments.argument
@@ -36,11 +37,14 @@ import com.github.ajalt.clikt.parameters.arguments.multiple
 import com.github.ajalt.clikt.parameters.options.default
 import com.github.ajalt.clikt.parameters.options.option
 import com.github.ajalt.clikt.parameters.options.required
+import com.github.ajalt.clikt.parameters.options.split
 import com.github.ajalt.clikt.parameters.options.switch
 import edu.cmu.isr.robust.util.SimpleTransitions
 import edu.cmu.isr.robust.util.StateMachine
 import edu.cmu.isr.robust.util.Transition
+import java.io.ByteArrayOutputStream
 import java.io.File
+import java.io.PrintStream
 import java.util.*
 
 class LTSAHelper : CliktCommand(name = "LTSAHelper", help = "Provides useful functions for LTSA.") {
@@ -74,33 +78,38 @@ class Convert : CliktCommand(help = "Convert between FSP files and JSON") {
     val f = File(file)
     val spec = f.readText()
     val comp = name?.let { LTSACall.doCompile(spec, it).doCompose() } ?: LTSACall.doCompile(spec).doCompose()
-    val m = StateMachine(comp)
-
-    val reachable = mutableListOf<Array<Int>>()
-    val q: Queue<Int> = LinkedList()
-    val visited = mutableSetOf<Int>()
-    val outTrans = m.transitions.outTrans()
+    printReachableJson(StateMachine(comp), f.absolutePath, comp.name)
+  }
+}
 
-    q.offer(0)
-    while (q.isNotEmpty()) {
-      val s = q.poll()
-      if (s in visited)
-        continue
-      visited.add(s)
-      outTrans[s]?.forEach {
-        reachable.add(arrayOf(it.first, it.second, it.third))
-        q.offer(it.third)
-      }
+/**
+ * Print the reachable part of a state machine as a JSON LTS.
+ */
+private fun printReachableJson(m: StateMachine, filename: String, process: String) {
+  val reachable = mutableListOf<Array<Int>>()
+  val q: Queue<Int> = LinkedList()
+  val visited = mutableSetOf<Int>()
+  val outTrans = m.transitions.outTrans()
+
+  q.offer(0)
+  while (q.isNotEmpty()) {
+    val s = q.poll()
+    if (s in visited)
+      continue
+    visited.add(s)
+    outTrans[s]?.forEach {
+      reachable.add(arrayOf(it.first, it.second, it.third))
+      q.offer(it.third)
     }
-
-    val json = StateMachineJson(
-      filename = f.absolutePath,
-      process = comp.name,
-      alphabet = m.alphabet,
-      transitions = reachable
-    )
-    jacksonObjectMapper().writerWithDefaultPrettyPrinter().writeValue(System.out, json)
   }
+
+  val json = StateMachineJson(
+    filename = filename,
+    process = process,
+    alphabet = m.alphabet,
+    transitions = reachable
+  )
+  jacksonObjectMapper().writerWithDefaultPrettyPrinter().writeValue(System.out, json)
 }
 
 private data class StateMachineJson(
@@ -164,4 +173,83 @@ class Abstract : CliktCommand(help = "Abstract a LTS by a given set of alphabets
 
 }
 
-fun main(args: Array<String>) = LTSAHelper().subcommands(Convert(), Abstract()).main(args)
+class Compose : CliktCommand(help = "Compose several models, hide the events outside the alphabet, and minimise") {
+
+  val alphabet by option("--alphabet", "-a", help = "Comma separated events to keep, all others are hidden")
+    .split(",").required()
+  val files by argument(help = "Input FSP or JSON files").multiple()
+
+  /**
+   * The composition is minimised by LTSA under observational equivalence, so the events outside the alphabet
+   * are turned into tau and removed where possible. The remaining tau transitions and the nondeterminism they
+   * leave are removed by a subset construction, since the synthesis expects a deterministic plant. The result
+   * is printed in the same JSON format as convert.
+   */
+  override fun run() {
+    if (files.isEmpty())
+      throw PrintMessage("Should provide at least one model to compose.")
+
+    val names = files.indices.map { "M$it" }
+    val specs = files.mapIndexed { i, file -> loadMachine(file).buildFSP(names[i]) }
+    val spec = combineSpecs(
+      *specs.toTypedArray(),
+      "||C = (${names.joinToString(" || ")})@{${alphabet.joinToString(", ")}}."
+    )
+    val comp = LTSACall.doCompile(spec, "C").doCompose().minimise()
+    val (dfa, _) = StateMachine(comp).tauElmAndSubsetConstr()
+    printReachableJson(dfa, "", "C")
+  }
+
+  private fun loadMachine(file: String): StateMachine {
+    val f = File(file)
+    if (file.endsWith(".json")) {
+      val obj = jacksonObjectMapper().readValue<StateMachineJson>(f.readText())
+      val trans = obj.transitions.map { Transition(it[0], it[1], it[2]) }
+      return StateMachine(SimpleTransitions(trans), obj.alphabet, emptySet())
+    }
+    return StateMachine(LTSACall.doCompile(f.readText()).doCompose())
+  }
+}
+
+class Serve : CliktCommand(help = "Keep the JVM alive and answer requests from stdin") {
+
+  /**
+   * Each request is one line holding the arguments of another sub-command separated by tabs, e.g.
+   * "convert\t--lts\tsys.lts". Each response is a header line "OK <n>" or "ERROR <n>" followed by
+   * exactly n bytes of UTF-8 output of that sub-command.
+   */
+  override fun run() {
+    val stdout = System.out
+    val reader = System.`in`.bufferedReader()
+    while (true) {
+      val line = reader.readLine() ?: break
+      if (line.isBlank())
+        continue
+
+      val buffer = ByteArrayOutputStream()
+      System.setOut(PrintStream(buffer, true, "UTF-8"))
+      val status = try {
+        helperCommand().parse(line.split("\t"))
+        "OK"
+      } catch (e: CliktError) {
+        println(e.message)
+        "ERROR"
+      } catch (e: Exception) {
+        println(e.message ?: e.toString())
+        "ERROR"
+      } finally {
+        System.out.flush()
+        System.setOut(stdout)
+      }
+
+      val body = buffer.toByteArray()
+      stdout.write("$status ${body.size}\n".toByteArray())
+      stdout.write(body)
+      stdout.flush()
+    }
+  }
+}
+
+private fun helperCommand() = LTSAHelper().subcommands(Convert(), Abstract(), Compose())
+
+fun main(args: Array<String>) = helperCommand().subcommands(Serve()).main(args)
@@ -0,0 +1,104 @@
+/*
+ * MIT License
+ *
+ * Copyright (c) 2020 Changjian Zhang, David Garlan, Eunsuk Kang
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy
+ * of this software and associated documentation files (the "Software"), to deal
+ * in the Software without restriction, including without limitation the rights
+ * to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+ * copies of the Software, and to permit persons to whom the Software is
+ * furnished to do so, subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in all
+ * copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+ * AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+ * LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+ * OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+ * SOFTWARE.
+ *
+ */
+
+package edu.cmu.isr.robust.ltsa
+
+import com.fasterxml.jackson.module.kotlin.jacksonObjectMapper
+import com.fasterxml.jackson.module.kotlin.readValue
+import org.junit.jupiter.api.Assertions.assertEquals
+import org.junit.jupiter.api.Assertions.assertFalse
+import org.junit.jupiter.api.Test
+import java.io.ByteArrayInputStream
+import java.io.ByteArrayOutputStream
+import java.io.File
+import java.io.PrintStream
+
+class LTSAHelperTest {
+
+  private fun captureOutput(f: () -> Unit): String {
+    val stdout = System.out
+    val buffer = ByteArrayOutputStream()
+    System.setOut(PrintStream(buffer, true, "UTF-8"))
+    try {
+      f()
+    } finally {
+      System.out.flush()
+      System.setOut(stdout)
+    }
+    return buffer.toString("UTF-8")
+  }
+
+  private fun writeSpec(spec: String): File {
+    val file = File.createTempFile("helper", ".lts")
+    file.deleteOnExit()
+    file.writeText(spec)
+    return file
+  }
+
+  @Test
+  fun testComposeIsDeterministic() {
+    // hiding c leaves a tau transition after a, so LTSA's minimised composition is nondeterministic
+    val file = writeSpec("P = (a -> b -> P | a -> c -> d -> P).")
+    val output = captureOutput { Compose().parse(listOf("-a", "a,b,d", file.path)) }
+    val obj = jacksonObjectMapper().readValue<Map<String, Any>>(output)
+    val alphabet = obj["alphabet"] as List<*>
+    val transitions = (obj["transitions"] as List<*>).map { (it as List<*>).map { x -> x as Int } }
+
+    assertFalse(transitions.any { alphabet[it[1]] == "_tau_" })
+    assertEquals(transitions.size, transitions.map { Pair(it[0], it[1]) }.toSet().size)
+    assertEquals(setOf("a", "b", "d"), transitions.map { alphabet[it[1]] }.toSet())
+  }
+
+  @Test
+  fun testServeFraming() {
+    val file = writeSpec("P = (a -> b -> P).")
+    val expected = captureOutput { Convert().parse(listOf("--lts", file.path)) }
+    // a blank line is skipped, an unknown command is an error, and the JVM keeps answering after it
+    val requests = "convert\t--lts\t${file.path}\n\nunknown\nconvert\t--lts\t${file.path}\n"
+
+    val stdin = System.`in`
+    System.setIn(ByteArrayInputStream(requests.toByteArray()))
+    val output = try {
+      captureOutput { Serve().parse(emptyList()) }
+    } finally {
+      System.setIn(stdin)
+    }
+
+    val bytes = output.toByteArray()
+    var pos = 0
+    val responses = mutableListOf<Pair<String, String>>()
+    while (pos < bytes.size) {
+      var end = pos
+      while (bytes[end] != '\n'.toByte())
+        end++
+      val (status, size) = String(bytes, pos, end - pos).split(" ")
+      responses.add(Pair(status, String(bytes, end + 1, size.toInt(), Charsets.UTF_8)))
+      pos = end + 1 + size.toInt()
+    }
+    assertEquals(listOf("OK", "ERROR", "OK"), responses.map { it.first })
+    assertEquals(expected, responses[0].second)
+    assertEquals(expected, responses[2].second)
+  }
+}
@@ -0,0 +1,145 @@
+"""
+Run many repair problems on a pool of worker processes.
+
+Usage:
+    python batch.py [-o OUT_DIR] [-j WORKERS] [--cache-dir DIR] [--store-dir DIR] JOBS...
+
+Each of JOBS is either the name of a bundled problem (see problems.py) or a JSON file holding a list of
+problem specs of the form
+    {"name": "therac25", "dir": "models/therac25", "n": 6, "args": {...}}
+where "args" are the keyword arguments of Repair, as passed by models/*/run.py, and relative "dir"s are
+resolved against the JSON file. Priority keys of "preferred", "controllable" and "observable" may be strings.
+
+Every job runs in its own process and scratch directory OUT_DIR/<name>/tmp, and writes its log, results
+and timings to OUT_DIR/<name>. All jobs share the read-only compiled model cache, and the store of synthesis
+results when --store-dir is given (see ResultStore). A summary of all jobs is written to OUT_DIR/summary.json.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from os import path
+
+this_file = path.dirname(path.abspath(__file__))
+sys.path.append(this_file)
+
+from repair import Repair
+from helper import DEFAULT_CACHE_DIR
+from problems import PROBLEMS
+
+
+def load_jobs(specs):
+    """
+    Resolve the JOBS arguments to a list of problem specs.
+    """
+    jobs = []
+    for spec in specs:
+        if spec in PROBLEMS:
+            jobs.append(dict(PROBLEMS[spec], name=spec))
+            continue
+        with open(spec) as f:
+            base = path.dirname(path.abspath(spec))
+            for job in json.load(f):
+                job = dict(job, dir=path.join(base, job.get("dir", ".")))
+                args = dict(job["args"])
+                for k in ["preferred", "controllable", "observable"]:
+                    args[k] = {int(p): events for p, events in args[k].items()}
+                job["args"] = args
+                jobs.append(job)
+
+    names = [job["name"] for job in jobs]
+    duplicated = set(n for n in names if names.count(n) > 1)
+    if len(duplicated) > 0:
+        raise Exception(f"Duplicated job names: {duplicated}")
+    return jobs
+
+
+def run_job(job, out_dir, cache_dir, store_dir=None):
+    """
+    Run one job in the current process and write its results to out_dir/<name>. Returns the summary of the job.
+    """
+    job_dir = path.abspath(path.join(out_dir, job["name"]))
+    os.makedirs(job_dir, exist_ok=True)
+    summary = {"name": job["name"], "dir": job["dir"]}
+    start = time.perf_counter()
+    with open(path.join(job_dir, "log.txt"), "w") as log, contextlib.redirect_stdout(log):
+        try:
+            # model files are relative to the problem directory, scratch files go to the job directory
+            os.chdir(job["dir"])
+            r = Repair(**dict(job["args"], work_dir=path.join(job_dir, "tmp"), cache_dir=cache_dir, store_dir=store_dir))
+            load_time = time.perf_counter() - start
+            results = r.synthesize(job.get("n", 6))
+            synthesize_time = time.perf_counter() - start - load_time
+
+            output = []
+            for c in results:
+                output.append({
+                    "controllable": sorted(c["controllable"]),
+                    "observable": sorted(c["observable"]),
+                    "preferred": sorted(c["preferred"]),
+                    "preferred_utility": c["preferred_utility"],
+                    "cost": c["cost"],
+                    "unknown": c["unknown"],
+                    "M_prime": r.fsm2fsp(c["M_prime"], c["observable"], name="M")
+                })
+            r.close()
+            with open(path.join(job_dir, "results.json"), "w") as f:
+                json.dump(output, f, indent=2)
+            summary.update({
+                "status": "ok",
+                "results": len(output),
+                "unknown": r.unknown_candidates,
+                "cache": r.cache_stats(),
+                "timings": {
+                    "load": load_time,
+                    "synthesize": synthesize_time,
+                    "total": time.perf_counter() - start
+                }
+            })
+        except Exception as e:
+            traceback.print_exc()
+            summary.update({"status": "error", "error": repr(e), "timings": {"total": time.perf_counter() - start}})
+
+    with open(path.join(job_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def _run_job(args):
+    return run_job(*args)
+
+
+def run_batch(jobs, out_dir, workers=None, cache_dir=DEFAULT_CACHE_DIR, store_dir=None):
+    """
+    Run the jobs on a pool of worker processes, one fresh process per job, and return their summaries in order.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers, maxtasksperchild=1) as pool:
+        summaries = []
+        for s in pool.imap(_run_job, [(job, out_dir, cache_dir, store_dir) for job in jobs]):
+            print(f"{s['name']}: {s['status']} ({s['timings']['total']:.2f}s)")
+            summaries.append(s)
+    with open(path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(summaries, f, indent=2)
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many robustness repair problems in parallel.")
+    parser.add_argument("jobs", nargs="+", help="bundled problem names or JSON files of problem specs")
+    parser.add_argument("-o", "--output", default="batch", help="the output directory")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="the shared compiled model cache")
+    parser.add_argument("--store-dir", default=None, help="the shared store of synthesis results across runs")
+    args = parser.parse_args()
+
+    run_batch(load_jobs(args.jobs), path.abspath(args.output), args.workers, args.cache_dir, args.store_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Benchmark the repair pipeline over the bundled case studies and synthetic scaled-up problems.
+
+Usage:
+    python benchmark.py [-o report.json] [--problems abp therac25 ...] [--scale 2 4 6] [--baseline old.json]
+                        [--trace-memory]
+
+Each problem runs in a fresh process, so its peak RSS is not affected by the other problems. The report
+is a JSON file with one entry per problem holding its wall time and peak RSS, and for each stage the number
+of calls and the total wall time (inclusive of nested stages, e.g. minimize includes its synthesis calls),
+together with automaton sizes and cache hit rates. With --trace-memory, each stage also reports the peak of
+the Python heap above its start, measured with tracemalloc; this slows the run down and does not see the
+memory allocated by igraph or the JVM.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from os import path
+
+this_file = path.dirname(path.abspath(__file__))
+sys.path.append(this_file)
+
+from repair import Repair
+from problems import PROBLEMS, synthetic_mutex
+
+
+STAGES = ["compile", "plant", "synthesize", "minimize", "check_preferred"]
+
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+class ProfiledRepair(Repair):
+    """
+    A Repair which records the time, automaton sizes, and, when tracemalloc is tracing, the peak memory of
+    each pipeline stage. The cache hits are those of Repair.cache_stats.
+    """
+    def __init__(self, *args, **kwargs):
+        self.stats = {s: {"calls": 0, "time": 0.0} for s in STAGES}
+        self.counters = {"supervisors": 0, "supervisor_max_states": 0, "supervisor_max_transitions": 0}
+        # [traced memory at the start, peak so far] of the running stages, innermost last
+        self.memory_frames = []
+        super().__init__(*args, **kwargs)
+
+    def _timed(self, stage, f, *args, **kwargs):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            # the peak is reset for this stage, so keep the one of the enclosing stage so far
+            if len(self.memory_frames) > 0:
+                self.memory_frames[-1][1] = max(self.memory_frames[-1][1], peak)
+            self.memory_frames.append([current, current])
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            s = self.stats[stage]
+            s["calls"] += 1
+            s["time"] += time.perf_counter() - start
+            if tracing:
+                frame = self.memory_frames.pop()
+                peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+                if len(self.memory_frames) > 0:
+                    self.memory_frames[-1][1] = max(self.memory_frames[-1][1], peak)
+                s["peak_alloc_kb"] = max(s.get("peak_alloc_kb", 0), (peak - frame[0]) // 1024)
+
+    def fsp2lts(self, file):
+        if file in self.fsp_cache:
+            return super().fsp2lts(file)
+        return self._timed("compile", super().fsp2lts, file)
+
+    def _plant_dfa(self, controllable, observable):
+        return self._timed("plant", super()._plant_dfa, controllable, observable)
+
+    def _synthesize(self, controllable, observable, minimal=True):
+        key = self._key(controllable, observable)
+        if (key if minimal else key + ("unminimized",)) in self.synthesize_cache:
+            return super()._synthesize(controllable, observable, minimal)
+        sup = self._timed("synthesize", super()._synthesize, controllable, observable, minimal)
+        if sup != None:
+            self.counters["supervisors"] += 1
+            self.counters["supervisor_max_states"] = max(self.counters["supervisor_max_states"], len(sup.all_states()))
+            self.counters["supervisor_max_transitions"] = max(self.counters["supervisor_max_transitions"], len(sup.transitions))
+        return sup
+
+    def minimize(self, minS, controllable, observable, preferred):
+        return self._timed("minimize", super().minimize, minS, controllable, observable, preferred)
+
+    def check_preferred(self, minS, controllable, observable, preferred):
+        return self._timed("check_preferred", super().check_preferred, minS, controllable, observable, preferred)
+
+
+def run_problem(name, problem, trace_memory=False):
+    """
+    Run one problem in the current process and return its report entry.
+    """
+    os.chdir(problem["dir"])
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    r = ProfiledRepair(**problem["args"])
+    results = r.synthesize(problem["n"])
+    wall_time = time.perf_counter() - start
+    r.close()
+
+    c = r.counters
+    jvm_calls = r.helper.calls + (r.loader.calls if r.loader != None else 0)
+    entry = {
+        "problem": name,
+        "wall_time": wall_time,
+        "peak_rss_kb": peak_rss_kb(),
+        "stages": r.stats,
+        "plant": None,
+        "supervisors": {
+            "count": c["supervisors"],
+            "max_states": c["supervisor_max_states"],
+            "max_transitions": c["supervisor_max_transitions"]
+        },
+        "cache": r.cache_stats(),
+        "jvm_calls": jvm_calls,
+        "pruned_candidates": r.pruned_candidates,
+        "results": len(results),
+        "M_prime": [{"states": len(x["M_prime"].vs), "transitions": len(x["M_prime"].es)} for x in results]
+    }
+    if r.plant != None:
+        entry["plant"] = {"states": len(r.plant.all_states()), "transitions": len(r.plant.transitions)}
+    return entry
+
+
+def _run_isolated(args):
+    name, problem, trace_memory = args
+    try:
+        return run_problem(name, problem, trace_memory)
+    except Exception as e:
+        return {"problem": name, "error": repr(e)}
+
+
+def compare(report, baseline):
+    """
+    Print the ratio of wall time and peak RSS of each problem and stage against a baseline report.
+    """
+    old = {e["problem"]: e for e in baseline["problems"]}
+    for e in report["problems"]:
+        if e["problem"] not in old or "error" in e or "error" in old[e["problem"]]:
+            continue
+        o = old[e["problem"]]
+        print(f"{e['problem']}: wall time x{e['wall_time'] / o['wall_time']:.2f}, "
+              f"peak RSS x{e['peak_rss_kb'] / max(o['peak_rss_kb'], 1):.2f}")
+        for s in STAGES:
+            if o["stages"][s]["time"] > 0:
+                print(f"\t{s}: x{e['stages'][s]['time'] / o['stages'][s]['time']:.2f}")
+
+
+def git_version():
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], cwd=this_file, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the robustness repair pipeline.")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="the JSON report to write")
+    parser.add_argument("--problems", nargs="*", default=list(PROBLEMS.keys()), help="bundled problems to run")
+    parser.add_argument("--scale", nargs="*", type=int, default=[2, 4, 6],
+                        help="numbers of processes of the synthetic mutual exclusion problems")
+    parser.add_argument("--baseline", help="a previous report to compare with")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="report the peak Python heap of each stage with tracemalloc (slower)")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="repair-bench-")
+    jobs = [(name, PROBLEMS[name], args.trace_memory) for name in args.problems]
+    for k in args.scale:
+        out_dir = path.join(scratch, f"mutex{k}")
+        os.mkdir(out_dir)
+        jobs.append((f"mutex{k}", synthetic_mutex(k, out_dir), args.trace_memory))
+
+    entries = []
+    ctx = multiprocessing.get_context("spawn")
+    for job in jobs:
+        print(f"Benchmark {job[0]}...")
+        # one fresh process per problem so that peak RSS is measured in isolation
+        with ctx.Pool(1) as pool:
+            entries.append(pool.map(_run_isolated, [job])[0])
+    shutil.rmtree(scratch)
+
+    report = {
+        "version": git_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "problems": entries
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Report written to", args.output)
+
+    if args.baseline != None:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
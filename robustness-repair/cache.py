@@ -0,0 +1,173 @@
+import os
+from collections import OrderedDict
+from os import path
+
+from lts import StateMachine, CSRTransitions
+from profiling import NULL_PROFILER
+
+
+def approx_size(value):
+    """
+    A rough estimate of the memory held by a cached value in bytes. A StateMachine is dominated by its
+    transitions, which take about 100 bytes each as [s, a, t] lists, plus the index that the first query
+    builds over them (see StateMachine._index), which is built here so that it is counted. Memory-mapped
+    transitions take 12 bytes each and are never indexed. DESops automata (igraph graphs) are counted by
+    their vertices and edges, which carry Python attributes.
+    """
+    if isinstance(value, StateMachine):
+        size = 200 + 50 * len(value.alphabet)
+        if isinstance(value.transitions, CSRTransitions):
+            return size + 12 * len(value.transitions)
+        value._index()
+        # the lists, their references in out_trans, the dense table and the state index
+        return size + 108 * len(value.transitions) + 4 * len(value._table) + 100 * len(value._state_idx)
+    if hasattr(value, "vs") and hasattr(value, "es"):
+        return 200 + 100 * len(value.vs) + 100 * len(value.es)
+    if isinstance(value, (list, tuple)):
+        return 100 + 50 * len(value)
+    return 100
+
+
+class MemoryBudget:
+    """
+    A limit of max_bytes on the entries in memory of several LRUCaches together. When it is exceeded, the least
+    recently used entry among all the caches is evicted. With max_bytes None, it never evicts.
+    """
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.caches = []
+        # orders the uses of the entries across the caches
+        self.clock = 0
+
+    def tick(self):
+        self.clock += 1
+        return self.clock
+
+    def enforce(self, newest):
+        """
+        Evict entries until the limit holds, except the entry just stored in the cache newest.
+        """
+        while self.max_bytes != None and self.bytes > self.max_bytes:
+            heads = [(c.oldest_use(), c) for c in self.caches
+                     if len(c.entries) > (1 if c is newest else 0)]
+            if len(heads) == 0:
+                break
+            min(heads, key=lambda x: x[0])[1].evict_oldest()
+
+
+class LRUCache:
+    """
+    A dict-like cache which evicts the least recently used entries once the entries in memory exceed their
+    budget (as estimated by sizeof). The budget is either max_bytes for this cache alone, or a MemoryBudget
+    shared with other caches. When spill_dir is given, evicted StateMachine values are written there in the
+    binary LTS format and memory-mapped back on demand, otherwise they are dropped and the caller computes
+    them again. The most recent entry is never evicted, so a value can always be read back right after it is
+    stored. With max_bytes None and no budget, it never evicts and behaves like a dict.
+    """
+    def __init__(self, name, max_bytes=None, spill_dir=None, sizeof=approx_size, profiler=NULL_PROFILER,
+                 budget=None):
+        self.name = name
+        self.budget = MemoryBudget(max_bytes) if budget == None else budget
+        self.budget.caches.append(self)
+        self.spill_dir = spill_dir
+        self.sizeof = sizeof
+        self.profiler = profiler
+        # key -> (value, size, last use) in memory, from the least to the most recently used
+        self.entries = OrderedDict()
+        # key -> file of the spilled values
+        self.spilled = {}
+        self.bytes = 0
+        self.evictions = 0
+        self.spills = 0
+        self.reloads = 0
+        self.n_files = 0
+
+    def __contains__(self, key):
+        return key in self.entries or key in self.spilled
+
+    def __len__(self):
+        return len(self.entries) + len(self.spilled)
+
+    def __getitem__(self, key):
+        if key in self.entries:
+            value, size, _ = self.entries[key]
+            self.entries[key] = (value, size, self.budget.tick())
+            self.entries.move_to_end(key)
+            return value
+        if key in self.spilled:
+            file = self.spilled.pop(key)
+            value = StateMachine.from_binary(file)
+            try:
+                # the mapping stays valid after the file is removed
+                os.remove(file)
+            except OSError:
+                pass
+            self.reloads += 1
+            self.profiler.count(f"cache.{self.name}.reload")
+            self._insert(key, value)
+            return value
+        raise KeyError(key)
+
+    def keys(self):
+        """
+        The keys in memory and spilled, without touching their recency.
+        """
+        return list(self.entries) + list(self.spilled)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __setitem__(self, key, value):
+        self.discard(key)
+        self._insert(key, value)
+
+    def discard(self, key):
+        if key in self.entries:
+            size = self.entries.pop(key)[1]
+            self.bytes -= size
+            self.budget.bytes -= size
+        elif key in self.spilled:
+            try:
+                os.remove(self.spilled.pop(key))
+            except OSError:
+                pass
+
+    def _insert(self, key, value):
+        size = self.sizeof(value)
+        self.entries[key] = (value, size, self.budget.tick())
+        self.bytes += size
+        self.budget.bytes += size
+        self.budget.enforce(self)
+
+    def oldest_use(self):
+        return next(iter(self.entries.values()))[2]
+
+    def evict_oldest(self):
+        old_key, (old_value, old_size, _) = self.entries.popitem(last=False)
+        self.bytes -= old_size
+        self.budget.bytes -= old_size
+        self.evictions += 1
+        self.profiler.count(f"cache.{self.name}.evict")
+        if self.spill_dir != None and isinstance(old_value, StateMachine):
+            self.spilled[old_key] = self._spill(old_value)
+
+    def _spill(self, value):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        # forked workers share the directory, so the files are named by process
+        file = path.join(self.spill_dir, f"{self.name}-{os.getpid()}-{self.n_files}.ltsb")
+        self.n_files += 1
+        value.to_binary(file)
+        self.spills += 1
+        self.profiler.count(f"cache.{self.name}.spill")
+        return file
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "spilled": len(self.spilled),
+            "bytes": self.bytes,
+            "evictions": self.evictions,
+            "spills": self.spills,
+            "reloads": self.reloads
+        }
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import queue
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+
+from profiling import NULL_PROFILER
+
+this_file = path.dirname(path.abspath(__file__))
+
+HELPER_JAR = path.join(this_file, "./bin/ltsa-helper.jar")
+# the default directory of the compiled model cache shared by all runs
+DEFAULT_CACHE_DIR = os.environ.get("LTSA_ROBUST_CACHE", path.join(this_file, ".cache"))
+
+
+def jar_version():
+    """
+    Identify the helper jar by the hash of its content, so that rebuilding the jar invalidates the cache.
+    """
+    h = hashlib.sha256()
+    with open(HELPER_JAR, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _bytes(src):
+    # cache keys hash model files read in binary mode as well as strings
+    return src if isinstance(src, bytes) else src.encode()
+
+
+class LTSAHelper:
+    """
+    A wrapper of bin/ltsa-helper.jar. By default, it keeps one JVM alive in the 'serve' mode and
+    sends every request through its stdin/stdout, so that the JVM startup is only paid once. When
+    the worker cannot be started or dies, it falls back to one 'java -jar' process per request.
+    """
+    def __init__(self, persistent=True, profiler=NULL_PROFILER):
+        self.persistent = persistent
+        self.profiler = profiler
+        self.proc = None
+        # number of requests sent to the helper jar
+        self.calls = 0
+
+    def call(self, *args):
+        """
+        Run a helper sub-command, e.g. call("convert", "--lts", file), and return its output.
+        """
+        self.calls += 1
+        if self.persistent:
+            try:
+                with self.profiler.span("jvm", command=args[0], mode="persistent"):
+                    return self._request(args)
+            except (OSError, ValueError) as e:
+                print("Warning: LTSA helper worker failed, fall back to one-shot mode:", e)
+                self.close()
+                self.persistent = False
+        with self.profiler.span("jvm", command=args[0], mode="one-shot"):
+            return subprocess.check_output(["java", "-jar", HELPER_JAR, *args], text=True)
+
+    def _request(self, args):
+        if self.proc == None or self.proc.poll() != None:
+            self.proc = subprocess.Popen(
+                ["java", "-jar", HELPER_JAR, "serve"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE
+            )
+        self.proc.stdin.write(("\t".join(args) + "\n").encode())
+        self.proc.stdin.flush()
+
+        header = self.proc.stdout.readline().decode().split()
+        if len(header) != 2:
+            raise ValueError("unexpected response from the worker")
+        status, size = header[0], int(header[1])
+        body = self.proc.stdout.read(size).decode()
+        if status != "OK":
+            raise subprocess.CalledProcessError(1, ["ltsa-helper", *args], output=body)
+        return body
+
+    def close(self):
+        if self.proc != None:
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.proc.kill()
+            self.proc = None
+
+
+class HelperPool:
+    """
+    A bounded pool of LTSA helpers for running requests concurrently. Each request of submit(f, *args) runs
+    f(helper, *args) on a thread with a helper of its own, and returns a Future of the result.
+    """
+    def __init__(self, size, persistent=True, profiler=NULL_PROFILER):
+        self.helpers = [LTSAHelper(persistent, profiler) for _ in range(size)]
+        self.free = queue.Queue()
+        for h in self.helpers:
+            self.free.put(h)
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="ltsa-helper")
+
+    @property
+    def calls(self):
+        return sum(h.calls for h in self.helpers)
+
+    def submit(self, f, *args):
+        def run():
+            helper = self.free.get()
+            try:
+                return f(helper, *args)
+            finally:
+                self.free.put(helper)
+        return self.executor.submit(run)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for h in self.helpers:
+            h.close()
+
+
+class ModelCache:
+    """
+    A content-addressed on-disk cache from FSP sources to the JSON LTS compiled by the helper. The key is
+    the hash of the FSP source and the helper jar, so entries stay valid across runs and never need to be
+    invalidated by hand. Entries are written atomically, so several processes can share one directory.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.version = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, *sources):
+        if self.version == None:
+            self.version = jar_version() if path.exists(HELPER_JAR) else "unknown"
+        h = hashlib.sha256(self.version.encode())
+        for src in sources:
+            h.update(b"\0")
+            h.update(_bytes(src))
+        return h.hexdigest()
+
+    def get(self, key):
+        try:
+            with open(path.join(self.cache_dir, f"{key}.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, obj):
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(obj, f)
+        os.replace(tmp, path.join(self.cache_dir, f"{key}.json"))
+
+
+class ResultStore:
+    """
+    An on-disk store of synthesis results, i.e., supervisors and preferred behavior checks, shared by repeated
+    runs of the same model. Results are filed under the hash of the model contents and keyed by the canonical
+    (sorted) controllable and observable events, so a run with different cost rankings finds the results of
+    the event sets it has in common with earlier runs. Like ModelCache, entries are written atomically, so
+    concurrent readers never see a partial entry.
+    """
+    def __init__(self, store_dir, model_key):
+        self.dir = path.join(store_dir, model_key)
+        os.makedirs(self.dir, exist_ok=True)
+
+    @staticmethod
+    def model_key(*sources):
+        h = hashlib.sha256()
+        for src in sources:
+            h.update(b"\0")
+            h.update(_bytes(src))
+        return h.hexdigest()
+
+    def key(self, kind, controllable, observable, *extra):
+        h = hashlib.sha256(kind.encode())
+        for events in [sorted(controllable), sorted(observable)]:
+            h.update(b"\0")
+            h.update("\t".join(events).encode())
+        for e in extra:
+            h.update(b"\0")
+            h.update(_bytes(e))
+        return f"{kind}-{h.hexdigest()}"
+
+    def get(self, key):
+        try:
+            with open(path.join(self.dir, f"{key}.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, obj):
+        fd, tmp = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(obj, f)
+        os.replace(tmp, path.join(self.dir, f"{key}.json"))
@@ -1,12 +1,259 @@
+import bisect
+import io
+import itertools
 import json
+import mmap
+import struct
+import sys
+import time
+from array import array
+from collections import deque
+from collections.abc import Mapping, Sequence
 from os import path
 
+def _dfa_event(d, a):
+    # newer DESops releases label edges with Event objects, older ones with plain strings
+    return d.Event(a) if hasattr(d, "Event") else a
+
+
+# marks the missing successors in the transition table of StateMachine
+_NO_STATE = -2 ** 31
+
+# The binary LTS format (.ltsb), all integers little-endian:
+#   header    magic b"LTSB", then uint32 version, states, events, accepting states, transitions, and the byte
+#             lengths of the name and of the alphabet table
+#   name      UTF-8, followed by the alphabet table as NUL separated UTF-8 events, padded to 4 bytes
+#   accept    int32[accepting states]
+#   row_ptr   int32[states + 1], the transitions of state s are row_ptr[s] until row_ptr[s + 1]
+#   events    int32[transitions], sorted by event within each state
+#   targets   int32[transitions]
+_LTSB_MAGIC = b"LTSB"
+_LTSB_VERSION = 1
+_LTSB_HEADER = struct.Struct("<4s7I")
+
+
+class CSRTransitions:
+    """
+    A read-only sequence of [s, a, t] transitions in CSR layout, e.g. memory-mapped from a .ltsb file by
+    StateMachine.from_binary. Transitions are created on access, so the arrays are never copied. Use
+    copy() to get a mutable list.
+    """
+    def __init__(self, row_ptr, events, targets, buffer=None):
+        self.row_ptr = row_ptr
+        self.events = events
+        self.targets = targets
+        # keep the mapped file open as long as the views are used
+        self.buffer = buffer
+
+    def __len__(self):
+        return len(self.events)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.events)
+        if i < 0 or i >= len(self.events):
+            raise IndexError("transition index out of range")
+        s = bisect.bisect_right(self.row_ptr, i) - 1
+        return [s, self.events[i], self.targets[i]]
+
+    def __iter__(self):
+        row_ptr, events, targets = self.row_ptr, self.events, self.targets
+        for s in range(len(row_ptr) - 1):
+            for i in range(row_ptr[s], row_ptr[s + 1]):
+                yield [s, events[i], targets[i]]
+
+    def copy(self):
+        return list(self)
+
+    def n_rows(self):
+        return len(self.row_ptr) - 1
+
+    def row(self, s):
+        """
+        The transitions of state s, as a view of the arrays.
+        """
+        if s < 0 or s >= self.n_rows():
+            return _CSRRow(s, self, 0, 0)
+        return _CSRRow(s, self, self.row_ptr[s], self.row_ptr[s + 1])
+
+    def successor(self, s, e):
+        """
+        The (first) target of the transition of state s by the event index e, or None, found by bisecting the
+        events of the row, which are sorted.
+        """
+        row = self.row(s)
+        i = bisect.bisect_left(self.events, e, row.lo, row.hi)
+        return self.targets[i] if i < row.hi and self.events[i] == e else None
+
+    def states(self):
+        """
+        State 0 and the states with transitions, in the order they are first seen when iterating.
+        """
+        states = {0: None}
+        for s in range(self.n_rows()):
+            lo, hi = self.row_ptr[s], self.row_ptr[s + 1]
+            if lo < hi:
+                states.setdefault(s)
+                for i in range(lo, hi):
+                    states.setdefault(self.targets[i])
+        return list(states)
+
+
+class _CSRRow(Sequence):
+    """
+    The transitions of one state of a CSRTransitions, created on access.
+    """
+    def __init__(self, s, csr, lo, hi):
+        self.s = s
+        self.csr = csr
+        self.lo = lo
+        self.hi = hi
+
+    def __len__(self):
+        return self.hi - self.lo
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("transition index out of range")
+        return [self.s, self.csr.events[self.lo + i], self.csr.targets[self.lo + i]]
+
+
+class _CSROutTrans(Mapping):
+    """
+    The out_trans() of a machine with CSRTransitions: the states with transitions mapped to their rows.
+    """
+    def __init__(self, csr):
+        self.csr = csr
+
+    def __getitem__(self, s):
+        if type(s) != int or len(self.csr.row(s)) == 0:
+            raise KeyError(s)
+        return self.csr.row(s)
+
+    def __iter__(self):
+        return (s for s in range(self.csr.n_rows()) if self.csr.row_ptr[s] < self.csr.row_ptr[s + 1])
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def _int32_view(buffer, offset, n):
+    view = memoryview(buffer)[offset:offset + 4 * n]
+    if sys.byteorder == "little":
+        return view.cast("i")
+    # the file is little-endian, so big-endian hosts have to copy it
+    a = array("i", view.tobytes())
+    a.byteswap()
+    return a
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised by an exploration that exceeds its Budget.
+    """
+    pass
+
+
+class Budget:
+    """
+    Limits on the states and transitions of the automata built by one call, and on its elapsed time. The
+    explorations call check() as they grow and stop by raising BudgetExceeded. A limit of None is unlimited.
+    """
+    def __init__(self, max_states=None, max_transitions=None, timeout=None):
+        self.max_states = max_states
+        self.max_transitions = max_transitions
+        self.deadline = time.monotonic() + timeout if timeout != None else None
+
+    def check(self, states=0, transitions=0):
+        if self.max_states != None and states > self.max_states:
+            raise BudgetExceeded(f"more than {self.max_states} states")
+        if self.max_transitions != None and transitions > self.max_transitions:
+            raise BudgetExceeded(f"more than {self.max_transitions} transitions")
+        if self.deadline != None and time.monotonic() > self.deadline:
+            raise BudgetExceeded("time limit exceeded")
+
+
 class StateMachine:
     def __init__(self, name, transitions, alphabet, accept=None):
         self.name = name
         self.transitions = transitions
         self.alphabet = alphabet
         self.accept = set() if accept == None else accept
+
+    # The transition table is indexed lazily: states and events are mapped to dense indices, and
+    # _table[state_idx * len(alphabet) + event_idx] holds the (first) successor or _NO_STATE, since -1 is
+    # the error state. The index is dropped whenever transitions or alphabet are reassigned, and rebuilt
+    # when their sizes change behind our back (e.g. m.transitions.append(...)). Use add_transition to keep
+    # it up to date. Machines with CSRTransitions (e.g. from_binary) are never indexed, their queries are
+    # answered from the arrays so that the transitions are not copied into lists.
+
+    @property
+    def transitions(self):
+        return self._transitions
+
+    @transitions.setter
+    def transitions(self, transitions):
+        self._transitions = transitions
+        self._table = None
+
+    @property
+    def alphabet(self):
+        return self._alphabet
+
+    @alphabet.setter
+    def alphabet(self, alphabet):
+        self._alphabet = alphabet
+        self._table = None
+        self._event_idx = None
+
+    def _index(self):
+        if self._table == None or self._indexed != (len(self._transitions), len(self._alphabet)):
+            self._build_index()
+
+    def _event_index(self):
+        # rebuilt when the alphabet grows behind our back, like the transition table
+        if self._event_idx == None or self._event_idx_size != len(self._alphabet):
+            self._event_idx = {}
+            for i, a in enumerate(self._alphabet):
+                self._event_idx.setdefault(a, i)
+            self._event_idx_size = len(self._alphabet)
+        return self._event_idx
+
+    def _build_index(self):
+        self._event_idx = None
+        self._event_index()
+        self._state_idx = {0: 0}
+        self._out = {}
+        self._table = array("i", [_NO_STATE] * len(self._alphabet))
+        for t in self._transitions:
+            self._insert(t)
+        self._indexed = (len(self._transitions), len(self._alphabet))
+
+    def _row(self, s):
+        if s not in self._state_idx:
+            self._state_idx[s] = len(self._state_idx)
+            self._table.extend([_NO_STATE] * len(self._alphabet))
+        return self._state_idx[s] * len(self._alphabet)
+
+    def _insert(self, t):
+        i = self._row(t[0]) + t[1]
+        self._row(t[2])
+        if self._table[i] == _NO_STATE:
+            self._table[i] = t[2]
+        if t[0] not in self._out:
+            self._out[t[0]] = []
+        self._out[t[0]].append(t)
+
+    def add_transition(self, s, a, t):
+        """
+        Append the transition [s, a, t], where a is the index of the event, keeping the index up to date.
+        """
+        self._index()
+        self._transitions.append([s, a, t])
+        self._insert(self._transitions[-1])
+        self._indexed = (len(self._transitions), len(self._alphabet))
     
     def extend_alphabet(self, alphabet):
         new_trans = self.transitions.copy()
@@ -19,105 +266,344 @@ class StateMachine:
         return StateMachine(self.name, new_trans, new_alphabet, self.accept)
     
     def next_state(self, s, a):
-        out_trans = self.out_trans()
-        i = self.alphabet.index(a)
-        if s in out_trans:
-            for t in out_trans[s]:
-                if t[1] == i:
-                    return t[2]
-        return None
+        if isinstance(self._transitions, CSRTransitions):
+            event_idx = self._event_index()
+            return self._transitions.successor(s, event_idx[a]) if a in event_idx else None
+        self._index()
+        if s not in self._state_idx or a not in self._event_idx:
+            return None
+        t = self._table[self._state_idx[s] * len(self._alphabet) + self._event_idx[a]]
+        return t if t != _NO_STATE else None
     
+    def used_events(self):
+        return set(self.alphabet[t[1]] for t in self.transitions)
+
+    @staticmethod
+    def parallel(*machines, name="plant", budget=None):
+        """
+        The parallel composition of the given machines, built on the fly from the initial state so that only
+        reachable product states are created. See Product for the synchronization rules. The exploration
+        stops with BudgetExceeded when the product outgrows the budget.
+        """
+        product = Product(machines)
+        alphabet_idx = {a: i for i, a in enumerate(product.alphabet)}
+        init = product.initial()
+        states = {init: 0}
+        q = deque([init])
+        transitions = []
+        while len(q) > 0:
+            st = q.popleft()
+            for a, nxt in product.successors(st):
+                if nxt not in states:
+                    states[nxt] = len(states)
+                    q.append(nxt)
+                transitions.append([states[st], alphabet_idx[a], states[nxt]])
+            if budget != None:
+                budget.check(len(states), len(transitions))
+
+        accept = set(i for st, i in states.items() if product.is_accept(st))
+        return StateMachine(name, transitions, product.alphabet, accept)
+
+    def is_deterministic(self):
+        pairs = set()
+        for t in self.transitions:
+            if (t[0], t[1]) in pairs:
+                return False
+            pairs.add((t[0], t[1]))
+        return True
+
+    def minimize(self):
+        """
+        Hopcroft's partition refinement over the reachable states of a deterministic machine. Missing
+        transitions go to an implicit sink that is never merged with a real state, so both the generated
+        and the accepted (marked) languages are preserved. Nondeterministic machines are returned as is.
+        """
+        if not self.is_deterministic():
+            return self
+        delta = {}
+        for t in self.transitions:
+            delta.setdefault(t[0], {})[t[1]] = t[2]
+
+        # reachable states, in BFS order from the initial state
+        order = [0]
+        seen = set(order)
+        for s in order:
+            for t in delta.get(s, {}).values():
+                if t not in seen:
+                    seen.add(t)
+                    order.append(t)
+        sink = object()
+        events = sorted(set(a for s in order for a in delta.get(s, {})))
+        inverse = {a: {} for a in events}
+        for s in order + [sink]:
+            for a in events:
+                t = delta.get(s, {}).get(a, sink) if s is not sink else sink
+                inverse[a].setdefault(t, []).append(s)
+
+        blocks = []
+        for b in [[s for s in order if s in self.accept], [s for s in order if s not in self.accept], [sink]]:
+            if len(b) > 0:
+                blocks.append(set(b))
+        block_of = {s: i for i, b in enumerate(blocks) for s in b}
+        work = set(range(len(blocks)))
+        while len(work) > 0:
+            splitter = list(blocks[work.pop()])
+            for a in events:
+                hit = {}
+                for t in splitter:
+                    for s in inverse[a].get(t, []):
+                        hit.setdefault(block_of[s], set()).add(s)
+                for i, x in hit.items():
+                    if len(x) == len(blocks[i]):
+                        continue
+                    blocks[i] -= x
+                    blocks.append(x)
+                    j = len(blocks) - 1
+                    for s in x:
+                        block_of[s] = j
+                    if i in work or len(x) <= len(blocks[i]):
+                        work.add(j)
+                    else:
+                        work.add(i)
+
+        # renumber the blocks from the initial state, dropping the sink
+        number = {}
+        for s in order:
+            if block_of[s] not in number:
+                number[block_of[s]] = len(number)
+        transitions = []
+        done = set()
+        for s in order:
+            if block_of[s] in done:
+                continue
+            done.add(block_of[s])
+            for a, t in delta.get(s, {}).items():
+                transitions.append([number[block_of[s]], a, number[block_of[t]]])
+        accept = set(number[block_of[s]] for s in order if s in self.accept)
+        return StateMachine(self.name, transitions, self.alphabet, accept)
+
+    def project(self, observable, budget=None):
+        """
+        The observer of this machine w.r.t the observable events, i.e., the subset construction which
+        hides all the other events. Only reachable subsets are created, and a subset is accepting when
+        any of its states is. The construction stops with BudgetExceeded when it outgrows the budget.
+        """
+        moves = {}
+        for t in self.transitions:
+            moves.setdefault(t[0], {}).setdefault(self.alphabet[t[1]], []).append(t[2])
+        observable = [a for a in self.alphabet if a in set(observable)]
+        alphabet_idx = {a: i for i, a in enumerate(self.alphabet)}
+
+        def closure(subset):
+            stack, result = list(subset), set(subset)
+            while len(stack) > 0:
+                s = stack.pop()
+                for a, ts in moves.get(s, {}).items():
+                    if a not in observable_set:
+                        for t in ts:
+                            if t not in result:
+                                result.add(t)
+                                stack.append(t)
+            return frozenset(result)
+
+        observable_set = set(observable)
+        init = closure([0])
+        states = {init: 0}
+        q = deque([init])
+        transitions = []
+        while len(q) > 0:
+            subset = q.popleft()
+            for a in observable:
+                nxt = set()
+                for s in subset:
+                    nxt.update(moves.get(s, {}).get(a, []))
+                if len(nxt) == 0:
+                    continue
+                nxt = closure(nxt)
+                if nxt not in states:
+                    states[nxt] = len(states)
+                    q.append(nxt)
+                transitions.append([states[subset], alphabet_idx[a], states[nxt]])
+            if budget != None:
+                budget.check(len(states), len(transitions))
+
+        accept = set(i for subset, i in states.items() if len(subset & self.accept) > 0)
+        return StateMachine(self.name, transitions, self.alphabet, accept)
+
     @staticmethod
     def from_json(file):
         with open(file) as f:
-            obj = json.load(f)
-            m = StateMachine(obj["process"], obj["transitions"], obj["alphabet"])
-            m.accept = m.all_states()
-            return m
+            return StateMachine.from_json_obj(json.load(f))
+
+    @staticmethod
+    def from_json_obj(obj):
+        m = StateMachine(obj["process"], obj["transitions"], obj["alphabet"])
+        m.accept = set(m.all_states())
+        return m
 
     @staticmethod
     def from_fsm(file, alphabet=None):
+        """
+        Parse a .fsm file line by line. States and events are indexed with dicts, so parsing is linear in the
+        size of the file and never holds more than one line of it in memory.
+        """
         if alphabet == None:
             alphabet = ["_tau_"]
         else:
             assert "_tau_" not in alphabet, "Tau should not be in the alphabet of FSM"
             alphabet = ["_tau_"] + list(alphabet)
+        states = {}
+        alphabet_map = {}
+        for i, a in enumerate(alphabet):
+            alphabet_map.setdefault(a, i)
+        transitions = []
+        accept = set()
+
+        def state_idx(s):
+            if s not in states:
+                states[s] = len(states)
+            return states[s]
+
+        def alphabet_idx(t):
+            if t not in alphabet_map:
+                # assert False, "ERROR! All alphabet should be included already."
+                alphabet_map[t] = len(alphabet)
+                alphabet.append(t)
+            return alphabet_map[t]
+
         with open(file) as f:
-            states = []
-            transitions = []
-            accept = set()
-
-            def state_idx(s):
-                if s in states:
-                    return states.index(s)
-                else:
-                    states.append(s)
-                    return len(states) - 1
-            
-            def alphabet_idx(t):
-                if t in alphabet:
-                    return alphabet.index(t)
-                else:
-                    # assert False, "ERROR! All alphabet should be included already."
-                    alphabet.append(t)
-                    return len(alphabet) - 1
-
-            lines = list(filter(lambda x: x != "\n", f.readlines()))
-            i = 1
-            while i < len(lines):
-                line_state = lines[i].strip().split("\t")
+            lines = (line.strip().split("\t") for line in f if line != "\n")
+            next(lines, None) # number of states
+            for line_state in lines:
                 s = state_idx(line_state[0])
                 if line_state[1] == "1": # marked
                     accept.add(s)
                 for _ in range(int(line_state[2])):
-                    i += 1
-                    line_t = lines[i].strip().split("\t")
-                    t = alphabet_idx(line_t[0])
-                    ss = state_idx(line_t[1])
-                    transitions.append([s, t, ss])
-                i += 1
+                    line_t = next(lines)
+                    transitions.append([s, alphabet_idx(line_t[0]), state_idx(line_t[1])])
 
-            name = path.basename(file)
-            name = name[:name.index(".")]
-            return StateMachine(name, transitions, alphabet, accept)
+        name = path.basename(file)
+        name = name[:name.index(".")]
+        return StateMachine(name, transitions, alphabet, accept)
 
     def out_trans(self):
-        out = {}
-        for t in self.transitions:
-            if t[0] not in out:
-                out[t[0]] = []
-            out[t[0]].append(t)
-        return out
+        if isinstance(self._transitions, CSRTransitions):
+            return _CSROutTrans(self._transitions)
+        self._index()
+        return self._out
     
     def all_states(self):
-        states = set([0])
-        for t in self.transitions:
-            states.add(t[0])
-            states.add(t[2])
-        return states
+        return frozenset(self._states())
+
+    def _states(self):
+        # the states in the order they are first seen, starting from state 0
+        if isinstance(self._transitions, CSRTransitions):
+            return self._transitions.states()
+        self._index()
+        return list(self._state_idx)
 
     def to_fsm(self, controllable, observable, file=None):
+        """
+        Serialize to the .fsm format. When a file is given, the output is streamed into it and None is returned,
+        otherwise the output is returned as a string.
+        """
+        if file != None:
+            with open(file, "w") as f:
+                self.write_fsm(f, controllable, observable)
+            return None
+        buffer = io.StringIO()
+        self.write_fsm(buffer, controllable, observable)
+        return buffer.getvalue()
+
+    def write_fsm(self, f, controllable, observable, chunk_size=8192):
+        """
+        Write the .fsm format into the text stream f, flushing the lines in chunks.
+        """
+        controllable, observable = set(controllable), set(observable)
         c = ["c" if a in controllable else "uc" for a in self.alphabet]
         o = ["o" if a in observable else "uo" for a in self.alphabet]
         all_states = self.all_states()
-        fsm = f"{len(all_states)}\n"
-
         out_trans = self.out_trans()
-        for s in out_trans:
-            fsm += "\n"
-            trans = out_trans[s]
-            fsm += f"State{s}\t{1 if s in self.accept else 0}\t{len(trans)}\n"
+        chunk = [f"{len(all_states)}\n"]
+
+        def emit(line):
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                f.write("".join(chunk))
+                chunk.clear()
+
+        # the states in the order they are first seen, starting from state 0, since readers (e.g. from_fsm and
+        # DESops) take the first state as the initial one
+        for s in self._states():
+            trans = out_trans.get(s, [])
+            emit(f"\nState{s}\t{1 if s in self.accept else 0}\t{len(trans)}\n")
             for t in trans:
-                fsm += f"{self.alphabet[t[1]]}\tState{t[2]}\t{c[t[1]]}\t{o[t[1]]}\n"
-        
-        for s in all_states - out_trans.keys():
-            fsm += f"\nState{s}\t{1 if s in self.accept else 0}\t0\n"
-        
-        if file != None:
-            with open(file, "w") as f:
-                f.write(fsm)
-        return fsm
+                emit(f"{self.alphabet[t[1]]}\tState{t[2]}\t{c[t[1]]}\t{o[t[1]]}\n")
+        f.write("".join(chunk))
     
+    def to_dfa(self, controllable, observable):
+        """
+        Build a DESops DFA in memory, labelled the same way as to_fsm does. State 0 is always
+        the initial (first) vertex, and the other states follow in the order they are first seen, so
+        that e.g. the error state -1 of a property never becomes the initial vertex.
+        """
+        import DESops as d
+        states = self._states()
+        idx = {s: i for i, s in enumerate(states)}
+        events = [_dfa_event(d, a) for a in self.alphabet]
+        used = set(t[1] for t in self.transitions)
+
+        g = d.DFA()
+        g.add_vertices(len(states), [f"State{s}" for s in states])
+        g.vs["marked"] = [s in self.accept for s in states]
+        if len(self.transitions) > 0:
+            g.add_edges(
+                [(idx[t[0]], idx[t[2]]) for t in self.transitions],
+                [events[t[1]] for t in self.transitions]
+            )
+        g.events = set(events[i] for i in used)
+        g.Euc, g.Euo = self.dfa_labels(controllable, observable)
+        return g
+
+    def dfa_labels(self, controllable, observable):
+        """
+        The uncontrollable and unobservable events of to_dfa, e.g. to relabel a copy of its result for
+        another split of the events instead of building it again.
+        """
+        import DESops as d
+        used = set(t[1] for t in self.transitions)
+        Euc = set(_dfa_event(d, self.alphabet[i]) for i in used if self.alphabet[i] not in controllable)
+        Euo = set(_dfa_event(d, self.alphabet[i]) for i in used if self.alphabet[i] not in observable)
+        return Euc, Euo
+
+    @staticmethod
+    def from_dfa(obj, alphabet=None, name="tmp"):
+        """
+        Convert a DESops DFA back to a StateMachine without going through a .fsm file. The
+        alphabet is handled the same way as from_fsm.
+        """
+        if alphabet == None:
+            alphabet = ["_tau_"]
+        else:
+            assert "_tau_" not in alphabet, "Tau should not be in the alphabet of FSM"
+            alphabet = ["_tau_"] + list(alphabet)
+        alphabet_map = {a: i for i, a in enumerate(alphabet)}
+
+        def alphabet_idx(t):
+            if t not in alphabet_map:
+                alphabet_map[t] = len(alphabet)
+                alphabet.append(t)
+            return alphabet_map[t]
+
+        transitions = []
+        for e in sorted(obj.es, key=lambda e: e.source):
+            label = e["label"]
+            transitions.append([e.source, alphabet_idx(str(getattr(label, "label", label))), e.target])
+        accept = set()
+        if "marked" in obj.vs.attributes():
+            accept = set(v.index for v in obj.vs if v["marked"])
+        return StateMachine(name, transitions, alphabet, accept)
+
     def to_json(self, file=None):
         obj = {
             "filename": file if file != None else "unknown",
@@ -125,7 +611,229 @@ class StateMachine:
             "alphabet": self.alphabet,
             "transitions": self.transitions
         }
+        if type(self.transitions) != list:
+            obj["transitions"] = list(self.transitions)
         if file != None:
             with open(file, "w") as f:
                 json.dump(obj, f)
         return json.dumps(obj)
+
+    def to_binary(self, file):
+        """
+        Write the .ltsb binary format, see CSRTransitions. States must be non-negative, except for targets
+        (e.g. the error state -1 of properties).
+        """
+        sources = set(t[0] for t in self.transitions)
+        assert all(s >= 0 for s in sources), "Source states of the binary format must be non-negative"
+        n_states = max(itertools.chain([0], (s + 1 for s in sources), (t[2] + 1 for t in self.transitions), (s + 1 for s in self.accept)))
+        rows = sorted(self.transitions, key=lambda t: (t[0], t[1], t[2]))
+        row_ptr = array("i", [0] * (n_states + 1))
+        for t in rows:
+            row_ptr[t[0] + 1] += 1
+        for s in range(n_states):
+            row_ptr[s + 1] += row_ptr[s]
+
+        name = self.name.encode()
+        table = b"\0".join(a.encode() for a in self.alphabet)
+        padding = -(len(name) + len(table)) % 4
+        with open(file, "wb") as f:
+            f.write(_LTSB_HEADER.pack(
+                _LTSB_MAGIC, _LTSB_VERSION, n_states, len(self.alphabet), len(self.accept), len(rows),
+                len(name), len(table)
+            ))
+            f.write(name + table + b"\0" * padding)
+            for a in [array("i", sorted(self.accept)), row_ptr,
+                      array("i", (t[1] for t in rows)), array("i", (t[2] for t in rows))]:
+                if sys.byteorder != "little":
+                    a.byteswap()
+                a.tofile(f)
+
+    @staticmethod
+    def from_binary(file):
+        """
+        Memory-map a .ltsb file. The transitions are a CSRTransitions view of the file and are not copied.
+        """
+        with open(file, "rb") as f:
+            if path.getsize(file) < _LTSB_HEADER.size:
+                raise ValueError(f"{file} is not a binary LTS file")
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_states, n_events, n_accept, n_trans, name_len, table_len = \
+            _LTSB_HEADER.unpack_from(buffer, 0)
+        if magic != _LTSB_MAGIC or version != _LTSB_VERSION:
+            raise ValueError(f"{file} is not a binary LTS file of version {_LTSB_VERSION}")
+
+        offset = _LTSB_HEADER.size
+        name = bytes(buffer[offset:offset + name_len]).decode()
+        offset += name_len
+        alphabet = bytes(buffer[offset:offset + table_len]).decode().split("\0") if n_events > 0 else []
+        offset += table_len + (-(name_len + table_len) % 4)
+
+        accept = _int32_view(buffer, offset, n_accept)
+        offset += 4 * n_accept
+        row_ptr = _int32_view(buffer, offset, n_states + 1)
+        offset += 4 * (n_states + 1)
+        events = _int32_view(buffer, offset, n_trans)
+        offset += 4 * n_trans
+        targets = _int32_view(buffer, offset, n_trans)
+        return StateMachine(name, CSRTransitions(row_ptr, events, targets, buffer), alphabet, set(accept))
+
+
+def convert(src, dst, controllable=None, observable=None):
+    """
+    Convert a state machine between the .json, .fsm and .ltsb formats by file extension. Writing .fsm needs the
+    controllable and observable events. Note that .json does not store accepting states, so every state of a
+    machine read from .json is accepting, the same as from_json.
+    """
+    if src.endswith(".ltsb"):
+        m = StateMachine.from_binary(src)
+    elif src.endswith(".fsm"):
+        m = StateMachine.from_fsm(src)
+    else:
+        m = StateMachine.from_json(src)
+
+    if dst.endswith(".ltsb"):
+        m.to_binary(dst)
+    elif dst.endswith(".fsm"):
+        assert controllable != None and observable != None, "Converting to .fsm needs the controllable and observable events"
+        m.to_fsm(controllable, observable, dst)
+    else:
+        m.to_json(dst)
+
+
+class Product:
+    """
+    The lazy parallel composition of a list of machines, whose states are tuples of component states.
+    Like the DESops composition of machines from to_dfa, components synchronize on the events that label
+    their transitions, and a product state is accepting when all its components are.
+    """
+    def __init__(self, machines):
+        self.machines = machines
+        self.moves = []
+        for m in machines:
+            mv = {}
+            for t in m.transitions:
+                mv.setdefault(t[0], {}).setdefault(m.alphabet[t[1]], []).append(t[2])
+            self.moves.append(mv)
+        self.owners = {}
+        for i, m in enumerate(machines):
+            for a in m.used_events():
+                self.owners.setdefault(a, []).append(i)
+        self.alphabet = []
+        for m in machines:
+            for a in m.alphabet:
+                if a in self.owners and a not in self.alphabet:
+                    self.alphabet.append(a)
+        self.order = {a: i for i, a in enumerate(self.alphabet)}
+
+    def initial(self):
+        return tuple(0 for _ in self.machines)
+
+    def is_accept(self, st):
+        return all(s in m.accept for s, m in zip(st, self.machines))
+
+    def successors(self, st):
+        """
+        The list of (event, next state) pairs enabled at the product state st, ordered by event.
+        """
+        enabled = set()
+        for i, s in enumerate(st):
+            enabled.update(self.moves[i].get(s, {}).keys())
+        succ = []
+        for a in sorted(enabled, key=lambda a: self.order[a]):
+            targets = [self.moves[i].get(st[i], {}).get(a) for i in self.owners[a]]
+            if None in targets:
+                continue
+            for combo in itertools.product(*targets):
+                nxt = list(st)
+                for i, t in zip(self.owners[a], combo):
+                    nxt[i] = t
+                succ.append((a, tuple(nxt)))
+        return succ
+
+
+def find_violation(p, machines, observable):
+    """
+    Check that every trace of the preferred behavior p can be performed by the composition of the machines
+    once the events outside the visible alphabet are hidden, where an event is visible when it is used by both
+    p and the composition and it is observable. The composition is explored lazily, by an on-the-fly subset
+    construction paired with p, and the search stops at the first trace of p that cannot be matched.
+    Returns None when p is included, otherwise the violating trace as a list of events.
+    """
+    return find_violations([p], machines, observable)[0]
+
+
+def find_violations(preferred, machines, observable, budget=None):
+    """
+    The same check as find_violation for several preferred behaviors at once. The composition is explored
+    once for all of them: the successors of composed states and the hidden-event closures are shared, and
+    the searches of all behaviors run in one queue until each one is either violated or exhausted.
+    Returns the violating trace, or None, of each behavior in order. The search stops with BudgetExceeded
+    when the explored composed states or transitions outgrow the budget.
+    """
+    product = Product(machines)
+    used = set(product.owners.keys()) & set(observable)
+    succ_cache = {}
+
+    explored_transitions = 0
+
+    def successors(st):
+        nonlocal explored_transitions
+        if st not in succ_cache:
+            succ_cache[st] = product.successors(st)
+            explored_transitions += len(succ_cache[st])
+            if budget != None:
+                budget.check(len(succ_cache), explored_transitions)
+        return succ_cache[st]
+
+    # closures are shared by the behaviors with the same visible alphabet
+    closure_cache = {}
+
+    def closure(visible, subset):
+        cache = closure_cache.setdefault(visible, {})
+        key = frozenset(subset)
+        if key not in cache:
+            stack, result = list(subset), set(subset)
+            while len(stack) > 0:
+                for a, nxt in successors(stack.pop()):
+                    if a not in visible and nxt not in result:
+                        result.add(nxt)
+                        stack.append(nxt)
+            cache[key] = frozenset(result)
+        return cache[key]
+
+    # for each behavior, pairs of a state of p and the set of composed states reachable by the same visible
+    # trace, kept as an antichain: a pair is skipped when a smaller set was already explored with the same
+    # state of p
+    searches = []
+    q = deque()
+    for i, p in enumerate(preferred):
+        visible = frozenset(p.used_events() & used)
+        p_moves = {}
+        for t in p.transitions:
+            p_moves.setdefault(t[0], []).append((p.alphabet[t[1]], t[2]))
+        init = (0, closure(visible, [product.initial()]))
+        searches.append((visible, p_moves, {0: [init[1]]}))
+        q.append((i, init, []))
+
+    violations = [None] * len(preferred)
+    while len(q) > 0:
+        i, (ps, subset), trace = q.popleft()
+        if violations[i] != None:
+            continue
+        visible, p_moves, explored = searches[i]
+        for a, pt in p_moves.get(ps, []):
+            if a in visible:
+                nxt = set()
+                for st in subset:
+                    nxt.update(t for b, t in successors(st) if b == a)
+                if len(nxt) == 0:
+                    violations[i] = trace + [a]
+                    break
+                nxt = closure(visible, nxt)
+            else:
+                nxt = subset
+            if any(s <= nxt for s in explored.get(pt, [])):
+                continue
+            explored[pt] = [s for s in explored.get(pt, []) if not nxt <= s] + [nxt]
+            q.append((i, (pt, nxt), trace + [a]))
+    return violations
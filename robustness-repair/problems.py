@@ -0,0 +1,215 @@
+import json
+from os import path
+
+from repair import PRIORITY0, PRIORITY1, PRIORITY2, PRIORITY3
+
+this_file = path.dirname(path.abspath(__file__))
+models_dir = path.join(this_file, "models")
+
+
+# Repair problems of the bundled case studies. Each problem has the model directory to run in, the keyword
+# arguments for Repair (the same as models/*/run.py), and the search depth n for Repair.synthesize.
+PROBLEMS = {
+    "abp": {
+        "dir": path.join(models_dir, "abp"),
+        "n": 6,
+        "args": {
+            "sys": ["sender.lts", "receiver.lts"],
+            "env_p": ["channel.lts"],
+            "safety": ["p.lts"],
+            "preferred": {PRIORITY3: [], PRIORITY2: [], PRIORITY1: [], PRIORITY0: []},
+            "progress": [],
+            "alphabet": ["send", "rec", "ack", "getack", "input", "output"],
+            "controllable": {
+                PRIORITY3: [],
+                PRIORITY2: ["send", "getack"],
+                PRIORITY1: ["rec", "ack"],
+                PRIORITY0: []
+            },
+            "observable": {
+                PRIORITY3: [],
+                PRIORITY2: [],
+                PRIORITY1: ["send", "rec", "ack", "getack"],
+                PRIORITY0: ["input", "output"]
+            }
+        }
+    },
+    "therac25": {
+        "dir": path.join(models_dir, "therac25"),
+        "n": 6,
+        "args": {
+            "sys": ["interface.lts", "power.lts"],
+            "env_p": ["env.lts"],
+            "safety": ["p.lts"],
+            "preferred": {
+                PRIORITY3: ["back.lts", "fire.lts"],
+                PRIORITY2: ["back1.lts"],
+                PRIORITY1: [],
+                PRIORITY0: []
+            },
+            "progress": [],
+            "alphabet": [
+                "hPressX", "hPressE", "hPressEnter", "hPressB", "mFire", "hPressUp", "hPressUp1", "mEBeamLvl",
+                "mXrayLvl", "mInPlace", "mOutPlace", "mInitXray", "mInitEBeam"
+            ],
+            "controllable": {
+                PRIORITY3: ["hPressX", "hPressE", "hPressEnter", "hPressB"],
+                PRIORITY2: ["hPressUp", "hPressUp1"],
+                PRIORITY1: ["mFire", "mEBeamLvl", "mXrayLvl", "mInPlace", "mOutPlace", "mInitXray", "mInitEBeam"],
+                PRIORITY0: []
+            },
+            "observable": {
+                PRIORITY3: [],
+                PRIORITY2: ["hPressX", "hPressE", "hPressEnter", "hPressB"],
+                PRIORITY1: ["hPressUp", "hPressUp1"],
+                PRIORITY0: ["mFire", "mEBeamLvl", "mXrayLvl", "mInPlace", "mOutPlace", "mInitXray", "mInitEBeam"]
+            }
+        }
+    },
+    "voting": {
+        "dir": path.join(models_dir, "voting"),
+        "n": 6,
+        "args": {
+            "sys": ["sys.lts"],
+            "env_p": ["env.lts"],
+            "safety": ["p2.lts"],
+            "preferred": {PRIORITY3: ["back.lts"], PRIORITY2: [], PRIORITY1: [], PRIORITY0: []},
+            "progress": ["confirm"],
+            "alphabet": ["back", "confirm", "password", "select", "vote", "eo.enter", "eo.exit", "v.enter", "v.exit"],
+            "controllable": {
+                PRIORITY3: ["eo.enter", "eo.exit", "v.enter", "v.exit"],
+                PRIORITY2: [],
+                PRIORITY1: [],
+                PRIORITY0: ["back", "confirm", "password", "select", "vote"]
+            },
+            "observable": {
+                PRIORITY3: [],
+                PRIORITY2: ["eo.exit", "v.exit", "eo.enter", "v.enter"],
+                PRIORITY1: [],
+                PRIORITY0: ["back", "confirm", "password", "select", "vote"]
+            }
+        }
+    },
+    "security": {
+        "dir": path.join(models_dir, "security"),
+        "n": 6,
+        "args": {
+            "sys": ["sys.lts"],
+            "env_p": ["env.lts"],
+            "safety": ["p.lts"],
+            "preferred": {PRIORITY3: [], PRIORITY2: [], PRIORITY1: [], PRIORITY0: []},
+            "progress": [],
+            "alphabet": [
+                "accept_server", "adversary_attacks", "check_info", "encr_device_to_platform",
+                "encr_entity_to_platform", "encr_msg_entity_to_platform", "encr_msg_platform_to_device",
+                "encr_platform_to_device", "encr_platform_to_server", "enter_id_password", "exit", "get_server",
+                "gibberish", "hoax", "msg_device_to_platform", "msg_platform_to_server", "password",
+                "receive_message", "reject", "reject_message", "reject_server", "select_server", "send_message",
+                "server", "server_platform_connect", "success", "verify_message"
+            ],
+            "controllable": {
+                PRIORITY3: [],
+                PRIORITY2: [],
+                PRIORITY1: [
+                    "accept_server", "check_info", "encr_device_to_platform", "encr_entity_to_platform",
+                    "encr_msg_entity_to_platform", "encr_msg_platform_to_device", "encr_platform_to_device",
+                    "encr_platform_to_server", "enter_id_password", "exit", "get_server", "gibberish",
+                    "msg_device_to_platform", "msg_platform_to_server", "receive_message", "reject", "reject_server",
+                    "select_server", "send_message", "server", "server_platform_connect", "success"
+                ],
+                PRIORITY0: []
+            },
+            "observable": {
+                PRIORITY3: [],
+                PRIORITY2: [],
+                PRIORITY1: [],
+                PRIORITY0: [
+                    "accept_server", "adversary_attacks", "check_info", "encr_device_to_platform",
+                    "encr_entity_to_platform", "encr_msg_entity_to_platform", "encr_msg_platform_to_device",
+                    "encr_platform_to_device", "encr_platform_to_server", "enter_id_password", "exit", "get_server",
+                    "gibberish", "hoax", "msg_device_to_platform", "msg_platform_to_server", "password",
+                    "receive_message", "reject", "reject_message", "reject_server", "select_server", "send_message",
+                    "server", "server_platform_connect", "success", "verify_message"
+                ]
+            }
+        }
+    },
+    "pump": {
+        "dir": path.join(models_dir, "pump"),
+        "n": 6,
+        "args": {
+            "sys": ["sys.lts"],
+            "env_p": ["deviation.lts"],
+            "safety": ["p.lts"],
+            "preferred": {PRIORITY3: [], PRIORITY2: [], PRIORITY1: [], PRIORITY0: []},
+            "progress": [],
+            "alphabet": [
+                "alarm_rings", "alarm_silence", "battery_charge", "battery_spent", "enable_alarm", "plug_in",
+                "power_failure", "turn_off", "turn_on", "unplug",
+                "line.1.change_settings", "line.1.clear_rate", "line.1.confirm_settings", "line.1.connect_set",
+                "line.1.dispense_main_med_flow", "line.1.enter_value", "line.1.erase_and_unlock_line",
+                "line.1.flow_complete", "line.1.lock_line", "line.1.lock_unit", "line.1.press_cancel",
+                "line.1.press_set", "line.1.purge_air", "line.1.set_rate", "line.1.unlock_unit"
+            ],
+            "controllable": {
+                PRIORITY3: [],
+                PRIORITY2: ["alarm_silence", "plug_in", "turn_off", "turn_on", "unplug"],
+                PRIORITY1: [
+                    "line.1.change_settings", "line.1.clear_rate", "line.1.confirm_settings", "line.1.connect_set",
+                    "line.1.enter_value", "line.1.erase_and_unlock_line", "line.1.lock_line", "line.1.lock_unit",
+                    "line.1.press_cancel", "line.1.press_set", "line.1.purge_air", "line.1.set_rate",
+                    "line.1.unlock_unit"
+                ],
+                PRIORITY0: []
+            },
+            "observable": {
+                PRIORITY3: [],
+                PRIORITY2: [],
+                PRIORITY1: ["alarm_rings", "battery_charge", "battery_spent", "enable_alarm", "power_failure"],
+                PRIORITY0: [
+                    "alarm_silence", "plug_in", "turn_off", "turn_on", "unplug",
+                    "line.1.change_settings", "line.1.clear_rate", "line.1.confirm_settings", "line.1.connect_set",
+                    "line.1.dispense_main_med_flow", "line.1.enter_value", "line.1.erase_and_unlock_line",
+                    "line.1.flow_complete", "line.1.lock_line", "line.1.lock_unit", "line.1.press_cancel",
+                    "line.1.press_set", "line.1.purge_air", "line.1.set_rate", "line.1.unlock_unit"
+                ]
+            }
+        }
+    }
+}
+
+
+def synthetic_mutex(k, out_dir):
+    """
+    Write a scalable mutual exclusion problem with k processes into out_dir and return it in the same form
+    as PROBLEMS. Process i loops on enter[i] -> exit[i], the safety property allows at most one process in
+    its critical section, and only enter[i] is controllable. The plant has 2^k states.
+    """
+    enter = [f"enter.{i}" for i in range(k)]
+    exit = [f"exit.{i}" for i in range(k)]
+
+    def write(name, alphabet, transitions):
+        with open(path.join(out_dir, name), "w") as f:
+            json.dump({"process": name[:name.index(".")].upper(), "alphabet": alphabet, "transitions": transitions}, f)
+
+    sys = []
+    for i in range(k):
+        write(f"proc{i}.json", [enter[i], exit[i]], [[0, 0, 1], [1, 1, 0]])
+        sys.append(f"proc{i}.json")
+    write("env.json", enter, [[0, i, 0] for i in range(k)])
+    write("p.json", enter + exit, [[0, i, i + 1] for i in range(k)] + [[i + 1, k + i, 0] for i in range(k)])
+
+    return {
+        "dir": out_dir,
+        "n": 6,
+        "args": {
+            "sys": sys,
+            "env_p": ["env.json"],
+            "safety": ["p.json"],
+            "preferred": {PRIORITY3: [], PRIORITY2: [], PRIORITY1: [], PRIORITY0: []},
+            "progress": [],
+            "alphabet": enter + exit,
+            "controllable": {PRIORITY3: [], PRIORITY2: [], PRIORITY1: enter, PRIORITY0: []},
+            "observable": {PRIORITY3: [], PRIORITY2: [], PRIORITY1: exit, PRIORITY0: enter}
+        }
+    }
@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import time
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """
+    The instrumentation hooks used by Repair. This base class is the disabled profiler: spans and counters
+    do nothing, and callers check 'enabled' before computing expensive attributes such as automaton sizes.
+    """
+    enabled = False
+
+    def span(self, name, **attrs):
+        """
+        A context manager timing one unit of work, e.g. with profiler.span("synthesize", ec=3) as s: ...
+        Attributes known only at the end can be added with s.set(...).
+        """
+        return _NULL_SPAN
+
+    def count(self, name, n=1, **attrs):
+        """
+        Increase the counter 'name' by n, e.g. profiler.count("synthesize.cache_hit").
+        """
+        pass
+
+
+NULL_PROFILER = Profiler()
+
+
+class _Span:
+    def __init__(self, profiler, name, attrs):
+        self.profiler = profiler
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type != None:
+            self.attrs["error"] = exc_type.__name__
+        self.profiler._emit({
+            "type": "span",
+            "name": self.name,
+            "start": self.start - self.profiler.origin,
+            "duration": end - self.start,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "attrs": self.attrs
+        })
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class TraceProfiler(Profiler):
+    """
+    Record timed spans and counters in memory. They can be exported as JSON lines, one event per line, or as
+    a Chrome trace (chrome://tracing, Perfetto, speedscope) for flame graphs.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = []
+        self.counters = {}
+
+    def span(self, name, **attrs):
+        return _Span(self, name, attrs)
+
+    def count(self, name, n=1, **attrs):
+        self.counters[name] = self.counters.get(name, 0) + n
+        self._emit({
+            "type": "counter",
+            "name": name,
+            "start": time.perf_counter() - self.origin,
+            "value": self.counters[name],
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "attrs": attrs
+        })
+
+    def _emit(self, event):
+        self.events.append(event)
+
+    def summary(self):
+        """
+        Total time and number of calls of each span name, and the final value of each counter.
+        """
+        spans = {}
+        for e in self.events:
+            if e["type"] == "span":
+                s = spans.setdefault(e["name"], {"calls": 0, "time": 0.0})
+                s["calls"] += 1
+                s["time"] += e["duration"]
+        return {"spans": spans, "counters": dict(self.counters)}
+
+    def to_jsonl(self, file):
+        with open(file, "w") as f:
+            for e in self.events:
+                f.write(json.dumps(e, default=str))
+                f.write("\n")
+
+    def to_chrome_trace(self, file):
+        trace = []
+        for e in self.events:
+            if e["type"] == "span":
+                trace.append({
+                    "name": e["name"], "ph": "X", "pid": e["pid"], "tid": e["tid"],
+                    "ts": e["start"] * 1e6, "dur": e["duration"] * 1e6, "args": e["attrs"]
+                })
+            else:
+                trace.append({
+                    "name": e["name"], "ph": "C", "pid": e["pid"], "tid": e["tid"],
+                    "ts": e["start"] * 1e6, "args": {"value": e["value"]}
+                })
+        with open(file, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f, default=str)
@@ -1,15 +1,21 @@
-import subprocess
 import os
+import json
 from os import path
 from random import random
 import shutil
 import DESops as d
 import igraph
-from lts import StateMachine
+from lts import StateMachine, Budget, BudgetExceeded, find_violations
+from helper import LTSAHelper, HelperPool, ModelCache, ResultStore, DEFAULT_CACHE_DIR
+from profiling import NULL_PROFILER
+from cache import LRUCache, MemoryBudget
+import heapq
 import itertools
-
-this_file = path.dirname(path.abspath(__file__))
-
+import time
+import multiprocessing
+import sys
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor
 
 # Definition of priority
 PRIORITY0 = 0
@@ -17,28 +23,130 @@ PRIORITY1 = 1
 PRIORITY2 = 2
 PRIORITY3 = 3
 
+# the Repair instance inherited by forked worker processes of minimize
+_worker_repair = None
+
+def _init_worker():
+    # do not share the pipes of the parent's helper JVM
+    _worker_repair.helper = LTSAHelper(_worker_repair.helper.persistent, _worker_repair.profiler)
+    # the loader threads are not forked, all models are loaded before (see _wait_models)
+    _worker_repair.loader = None
+
+def _worker_evaluate(controllable, observable, preferred):
+    return _worker_repair._evaluate_candidate(controllable, observable, preferred)
+
+def _can_fork():
+    # fork is not available on Windows and not safe on macOS, where the evaluation falls back to one process
+    return "fork" in multiprocessing.get_all_start_methods() and sys.platform != "darwin"
+
 class Repair:
-    def __init__(self, sys, env_p, safety, preferred, progress, alphabet, controllable, observable, verbose=False):
+    def __init__(self, sys, env_p, safety, preferred, progress, alphabet, controllable, observable, verbose=False,
+                 persistent_helper=True, cache_dir=DEFAULT_CACHE_DIR, workers=1, on_the_fly=True, profiler=None,
+                 lazy_inclusion=True, work_dir="tmp", minimize_automata=True, single_pass=True,
+                 ltsa_plant=False, store_dir=None, incremental=True, load_workers=4, max_states=None,
+                 max_transitions=None, call_timeout=None, cache_memory=None):
         self.verbose = verbose
-        if path.exists("tmp"):
-            shutil.rmtree("tmp")
-        os.mkdir("tmp")
+        # minimize supervisors and composed designs (see _minimize_lts), with the state counts before and after
+        self.minimize_automata = minimize_automata
+        self.minimization_stats = {}
+        # the scratch directory of this instance, which is cleared on start
+        self.work_dir = work_dir
+        # check preferred behavior with the on-the-fly inclusion check instead of DESops observer/compare_language
+        self.lazy_inclusion = lazy_inclusion
+        # with lazy_inclusion, check all preferred behavior in one exploration of M'||E (see find_violations)
+        self.single_pass = single_pass
+        # instrumentation hooks (see profiling.py), which do nothing by default
+        self.profiler = NULL_PROFILER if profiler == None else profiler
+        # build the plant as an on-the-fly reachable product instead of composing it with DESops
+        self.on_the_fly = on_the_fly
+        # the reachable product of sys and env_p, built by the first _synthesize call, and its DFA
+        self.plant = None
+        self.plant_error = None
+        self.plant_dfa = None
+        # limits on the automata built by one _synthesize or check_preferred call and on its time (see Budget),
+        # and the candidates of minimize which exceeded them, reported as unknown. The explorations of this
+        # package stop as soon as they exceed a limit, while DESops steps (e.g. supremal_sublanguage) are only
+        # checked after they return
+        self.max_states = max_states
+        self.max_transitions = max_transitions
+        self.call_timeout = call_timeout
+        self.unknown = {}
+        self.unknown_candidates = []
+        # compose sys and env_p with LTSA instead, minimised with the events outside alphabet hidden
+        self.ltsa_plant = ltsa_plant
+        # number of processes used to check the candidates in minimize
+        self.workers = workers
+        # the worker pool of the current minimize call, see _open_pool
+        self.pool = None
+        # the LTSA helper, which keeps one JVM alive for this instance unless persistent_helper is False
+        self.helper = LTSAHelper(persistent_helper, self.profiler)
+        # on-disk cache of compiled FSP models shared across runs, disabled when cache_dir is None
+        self.model_cache = ModelCache(cache_dir) if cache_dir != None else None
+        # the model files are loaded concurrently by a pool of load_workers helpers, and each file has a
+        # future which is only waited for when the model is first needed (see fsp2lts). The pool is shut down
+        # once all the futures are done
+        self.loader = HelperPool(load_workers, persistent_helper, self.profiler) if load_workers > 1 else None
+        self.model_futures = {}
+        if path.exists(work_dir):
+            shutil.rmtree(work_dir)
+        os.makedirs(work_dir)
 
-        # cache for fsp to lts
-        self.fsp_cache = {}
+        # every set of events is represented by a bitmask over this index of the alphabet, which gives canonical
+        # and cheap cache keys (see _mask), and indexed_events maps the bits back to the events (see _mask_cost)
+        self.indexed_events = list(dict.fromkeys(alphabet))
+        self.event_index = {a: i for i, a in enumerate(self.indexed_events)}
+        # hits and misses of the caches, see cache_stats
+        self.cache_counts = {}
+        # the following caches keep at most cache_memory bytes in memory together (None is unbounded) and
+        # evict the least recently used entries among them, see LRUCache; evicted supervisors and sublanguages
+        # are spilled to work_dir, the other entries are dropped and computed again when needed
+        self.cache_budget = MemoryBudget(cache_memory)
+        spill_dir = path.join(work_dir, "cache")
+        # cache for fsp to lts, which is not bounded since every synthesis needs the models again
+        self.fsp_cache = LRUCache("fsp", profiler=self.profiler)
         # cache for satisfied preferred behavior w.r.t some controllable and observable events
-        self.check_preferred_cache = {}
+        self.check_preferred_cache = LRUCache("check_preferred", profiler=self.profiler, budget=self.cache_budget)
         # cache for controller synthesis result w.r.t some controllable and observable events
-        self.synthesize_cache = {}
+        self.synthesize_cache = LRUCache("synthesize", spill_dir=spill_dir, profiler=self.profiler, budget=self.cache_budget)
+        # start the synthesis from the supremal sublanguage of a synthesized superset of the events (see
+        # _warm_start), kept as StateMachine values by the bitmasks of the events
+        self.incremental = incremental
+        self.sublanguages = LRUCache("sublanguages", spill_dir=spill_dir, profiler=self.profiler, budget=self.cache_budget)
+        # the number of transitions of each sublanguage, to pick the parent without loading spilled ones
+        self.sublanguage_sizes = {}
+        # caches for M'||E, its projections, and the preferred behavior DFAs used by check_preferred
+        self.M_prime_env_cache = LRUCache("M_prime_env", profiler=self.profiler, budget=self.cache_budget)
+        self.observer_cache = LRUCache("observer", profiler=self.profiler, budget=self.cache_budget)
+        self.preferred_fsm_cache = LRUCache("preferred_fsm", profiler=self.profiler, budget=self.cache_budget)
+        # supervisors as StateMachine objects for the lazy inclusion check, and the violating trace of
+        # each preferred behavior that is not fulfilled
+        self.sup_lts_cache = LRUCache("sup_lts", profiler=self.profiler, budget=self.cache_budget)
+        self.preferred_counterexamples = LRUCache("counterexamples", profiler=self.profiler, budget=self.cache_budget)
+        # maximal (controllable, observable) bitmask pairs known to be unsynthesizable, see _implied_unsynthesizable
+        self.unsynthesizable = []
+        # number of candidates skipped in minimize because they are implied to be unsynthesizable
+        self.pruned_candidates = 0
+        # number of candidates evaluated in minimize, and the budget of synthesize_iter (see _out_of_budget)
+        self.evaluated_candidates = 0
+        self.deadline = None
+        self.max_candidates = None
+        self.budget_exhausted = False
+        # number of brackets of preferred behavior explored and skipped by the bound in the last synthesize
+        self.brackets_explored = 0
+        self.brackets_skipped = 0
 
         # the model files of the system
-        self.sys = list(map(lambda x: self.fsp2lts(x), sys))
+        self.sys_files = sys
         # the model files of the deviated environment model
-        self.env_p = list(map(lambda x: self.fsp2lts(x), env_p))
+        self.env_p_files = env_p
         # the model files of the safety property
-        self.safety = list(map(lambda x: self.fsp2lts(x), safety))
+        self.safety_files = safety
         # a map from priority to model files of the preferred behavior
         self.preferred = preferred
+        if self.loader != None:
+            for file in sys + env_p + safety + [p for ps in preferred.values() for p in ps]:
+                if file not in self.model_futures:
+                    self.model_futures[file] = self.loader.submit(self._load_model, file)
         # a list of events as progress property
         self.progress = list(map(lambda x: self.make_progress_prop(x), progress))
         # a list of events for \alpha M \cup \alpha E
@@ -47,6 +155,22 @@ class Repair:
         self.controllable = controllable
         # a map from cost to list of observable events
         self.observable = observable
+        if ltsa_plant:
+            self.plant = self.compose_plant(sys + env_p)
+
+        # on-disk store of supervisors and preferred behavior checks shared by repeated runs of the same
+        # model, disabled when store_dir is None
+        self.result_store = None
+        if store_dir != None:
+            sources = [f"ltsa_plant={ltsa_plant}", f"minimize_automata={minimize_automata}"]
+            for kind, files in [("sys", sys), ("env_p", env_p), ("safety", safety)]:
+                for file in files:
+                    # binary, since the models may be .ltsb files
+                    with open(file, "rb") as f:
+                        sources.append(kind.encode() + b":" + f.read())
+            sources.append("progress:" + "\t".join(progress))
+            sources.append("alphabet:" + "\t".join(sorted(alphabet)))
+            self.result_store = ResultStore(store_dir, ResultStore.model_key(*sources))
 
         # TODO:
         # assert controllable should be a subset of observable
@@ -55,38 +179,211 @@ class Repair:
         # assert False, "Observable events should be a subset of the alphabet
         # assert False, "For the same event e, cost of Ac(a) > cost of Ao(a)"
     
-    def _synthesize(self, controllable, observable):
+    def _mask(self, events):
+        """
+        The bitmask of a set of events over event_index. Events outside the alphabet are rejected, since they
+        would not have a cost either.
+        """
+        if type(events) == int:
+            return events
+        mask = 0
+        for a in events:
+            if a not in self.event_index:
+                raise ValueError(f"Event {a} is not in the alphabet")
+            mask |= 1 << self.event_index[a]
+        return mask
+
+    def _key(self, controllable, observable):
+        # equal sets give equal keys, whatever their type or iteration order
+        return (self._mask(controllable), self._mask(observable))
+
+    def _count_cache(self, name, hit):
+        counts = self.cache_counts.setdefault(name, [0, 0])
+        counts[0 if hit else 1] += 1
+        self.profiler.count(f"{name}.cache_hit" if hit else f"{name}.cache_miss")
+
+    def cache_stats(self):
+        """
+        The hits, misses, and hit rate of each cache, e.g. {"synthesize": {"hits": 10, "misses": 5, "hit_rate": 0.67}},
+        together with the entries, evictions, spills and reloads of the LRU caches (see LRUCache.stats).
+        """
+        stats = {}
+        for name, (hits, misses) in self.cache_counts.items():
+            stats[name] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses > 0 else None}
+        for cache in [self.fsp_cache, self.check_preferred_cache, self.synthesize_cache, self.sublanguages,
+                      self.M_prime_env_cache, self.observer_cache, self.preferred_fsm_cache, self.sup_lts_cache,
+                      self.preferred_counterexamples]:
+            stats.setdefault(cache.name, {}).update(cache.stats())
+        return stats
+
+    @property
+    def sys(self):
+        return [self.fsp2lts(x) for x in self.sys_files]
+
+    @property
+    def env_p(self):
+        return [self.fsp2lts(x) for x in self.env_p_files]
+
+    @property
+    def safety(self):
+        return [self.fsp2lts(x) for x in self.safety_files]
+
+    def _wait_models(self):
+        """
+        Wait for all the models being loaded, e.g. before forking workers which do not have the loader threads.
+        """
+        for file in list(self.model_futures):
+            self.fsp2lts(file)
+
+    def _synthesize(self, controllable, observable, minimal=True):
         """
         Given a set of preferred behavior, controllable events, and observable events,
         this function returns a controller by invoking DESops. None is returned when
-        no such controller can be found.
+        no such controller can be found. With minimal False, the controller is returned before
+        minimization (see remove_unnecessary); it is cached and stored apart from the minimal one.
         """
-        key = (tuple(controllable), tuple(observable))
-        if key in self.synthesize_cache:
+        key = self._key(controllable, observable)
+        # the unminimized controller is kept next to the minimal one under its own key
+        cache_key = key if minimal else key + ("unminimized",)
+        if cache_key in self.synthesize_cache:
+            self._count_cache("synthesize", True)
             if self.verbose:
-                print("Synthesize cache hit: ", key)
-            return self.synthesize_cache[key]
+                print("Synthesize cache hit: ", controllable, observable)
+            return self.synthesize_cache[cache_key]
+        self._count_cache("synthesize", False)
 
-        plant = list(map(lambda x: self.lts2fsm(x, controllable, observable), self.sys + self.env_p))
-        plant = d.composition.parallel(*plant)
-        p = list(map(lambda x: self.lts2fsm(x, controllable, observable, extend_alphabet=True), self.safety))
-        p = p + self.progress
-        p = p[0] if len(p) == 1 else d.composition.parallel(*p)
+        store_key = None
+        if self.result_store != None:
+            store_key = self.result_store.key("sup" if minimal else "sup_unminimized", controllable, observable)
+            obj = self.result_store.get(store_key)
+            if obj != None:
+                self.profiler.count("synthesize.store_hit")
+                sup = self._load_sup(obj["sup"])
+                self.synthesize_cache[cache_key] = sup
+                return sup
 
-        L = d.supervisor.supremal_sublanguage(plant, p, prefix_closed=False, mode=d.supervisor.Mode.CONTROLLABLE_NORMAL)
-        L = d.composition.observer(L)
+        budget = self._budget()
+        with self.profiler.span("synthesize", controllable=len(controllable), observable=len(observable)) as span:
+            plant = self._plant_dfa(controllable, observable)
+            self._check_budget(budget, plant)
+            p = self._warm_start(plant, controllable, observable) if self.incremental else None
+            if p == None:
+                p = list(map(lambda x: self.lts2fsm(x, controllable, observable, extend_alphabet=True), self.safety))
+                p = p + self.progress
+                p = p[0] if len(p) == 1 else d.composition.parallel(*p)
+            else:
+                self.profiler.count("synthesize.warm_start")
+
+            L = d.supervisor.supremal_sublanguage(plant, p, prefix_closed=False, mode=d.supervisor.Mode.CONTROLLABLE_NORMAL)
+            self._check_budget(budget, L)
+            if self.incremental and len(L.vs) != 0:
+                sublanguage = self.fsm2lts(L)
+                self.sublanguages[key] = sublanguage
+                self.sublanguage_sizes[key] = len(sublanguage.transitions)
+            sup = None
+            if len(L.vs) != 0:
+                if self.on_the_fly:
+                    # the subset construction checks the budget as it grows, unlike the DESops observer
+                    L = self.fsm2lts(L, observable).project(observable, budget)
+                else:
+                    L = d.composition.observer(L)
+                    self._check_budget(budget, L)
+                # return the constructed controller which is admissible and redundant
+                sup = self.construct_supervisor(plant, L, controllable, observable, budget)
+            minS = self._minimize_lts(sup, "construct_supervisor") if sup != None else None
+            self.synthesize_cache[key] = minS
+            if not minimal:
+                self.synthesize_cache[cache_key] = sup
+            if self.profiler.enabled:
+                span.set(
+                    plant_states=len(plant.vs), plant_transitions=len(plant.es),
+                    sup_states=len(minS.all_states()) if minS != None else 0,
+                    sup_transitions=len(minS.transitions) if minS != None else 0
+                )
+        if store_key != None:
+            self.result_store.put(self.result_store.key("sup", controllable, observable), {"sup": self._dump_sup(minS)})
+            if not minimal:
+                self.result_store.put(store_key, {"sup": self._dump_sup(sup)})
+        return minS if minimal else sup
+
+    def _dump_sup(self, sup):
+        if sup == None:
+            return None
+        return {"transitions": sup.transitions, "alphabet": sup.alphabet, "accept": sorted(sup.accept)}
 
-        # return the constructed controller which is admissible and redundant
-        self.synthesize_cache[key] = self.construct_supervisor(plant, L, controllable, observable) if len(L.vs) != 0 else None
-        return self.synthesize_cache[key]
+    def _load_sup(self, obj):
+        if obj == None:
+            return None
+        return StateMachine("sup", obj["transitions"], obj["alphabet"], set(obj["accept"]))
     
+    def _budget(self):
+        """
+        A fresh Budget for one call, or None when there are no limits.
+        """
+        if self.max_states == None and self.max_transitions == None and self.call_timeout == None:
+            return None
+        return Budget(self.max_states, self.max_transitions, self.call_timeout)
+
+    def _check_budget(self, budget, g):
+        # DESops cannot be interrupted, so its results are checked between the steps of a call
+        if budget != None and type(g) != igraph.Graph:
+            budget.check(len(g.vs), len(g.es))
+
+    def _warm_start(self, plant, controllable, observable):
+        """
+        The supremal controllable and normal sublanguage only shrinks when events are removed from Ec or Eo,
+        so the one of any synthesized superset (Ec', Eo') contains the new one and is contained in the
+        specification. Using it as the specification gives the same result as starting from the safety and
+        progress properties, but from a much smaller automaton. Returns None when there is no such superset.
+        """
+        c, o = self._key(controllable, observable)
+        parents = [(n, (pc, po)) for (pc, po), n in self.sublanguage_sizes.items() if c & ~pc == 0 and o & ~po == 0]
+        parent = None
+        for _, k in sorted(parents):
+            if k in self.sublanguages:
+                parent = self.sublanguages[k]
+                break
+            # dropped from the cache without a spill directory
+            del self.sublanguage_sizes[k]
+        if parent == None:
+            return None
+        spec = parent.to_dfa(controllable, observable)
+        # events that the parent never allows must stay blocked instead of becoming private to the plant
+        spec.events = plant.events.copy()
+        spec.Euc = plant.Euc.copy()
+        spec.Euo = plant.Euo.copy()
+        return spec
+
+    def _plant_dfa(self, controllable, observable):
+        """
+        The composition of the system and the deviated environment as a DFA labelled by the given events.
+        """
+        # the plant does not depend on the event split, so its reachable product is built only once
+        if self.plant_error != None:
+            raise self.plant_error
+        if self.plant == None and self.on_the_fly:
+            try:
+                self.plant = StateMachine.parallel(*(self.sys + self.env_p), budget=self._budget())
+            except BudgetExceeded as e:
+                # every call would build the same plant again
+                self.plant_error = BudgetExceeded(f"plant: {e}")
+                raise self.plant_error
+        if self.plant != None:
+            # only the labels depend on the event split, the synthesis gets its own copy to work on
+            if self.plant_dfa == None:
+                self.plant_dfa = self.plant.to_dfa(controllable, observable)
+            g = self.plant_dfa.copy()
+            g.Euc, g.Euo = self.plant.dfa_labels(controllable, observable)
+            return g
+        plant = list(map(lambda x: self.lts2fsm(x, controllable, observable), self.sys + self.env_p))
+        return d.composition.parallel(*plant)
+
     def remove_unnecessary(self, sup, controllable, observable):
         """
         Given a plant, controller, controllable events, and observable events, remove unnecessary
         controllable/observable events to minimize its cost.
         """
         all_states = sup.all_states()
-        out_trans = sup.out_trans()
 
         can_uc = observable.copy()
         for s in all_states:
@@ -96,14 +393,15 @@ class Repair:
         can_uo = can_uc.copy()
         for s in all_states:
             for a in can_uo.copy():
-                if [s, sup.alphabet.index(a), s] not in out_trans[s]:
+                if sup.next_state(s, a) != s: # sup is deterministic, so this is the only a-transition
                     can_uo.remove(a)
         min_controllable = set(controllable) - set(can_uc)
         min_observable = set(observable) - set(can_uo)
 
         # Hide unobservable events
-        sup = self.lts2fsm(sup, min_controllable, min_observable, name="sup")
+        sup = self.lts2fsm(sup, min_controllable, min_observable)
         sup = d.composition.observer(sup)
+        sup = self._minimize_dfa(sup, "remove_unnecessary")
 
         return sup, min_controllable, min_observable
     
@@ -128,11 +426,28 @@ class Repair:
 
         # remove duplicates
         cp_list = []
+        seen = set()
         for event_dict in p_list:
-            if event_dict not in cp_list:
+            key = self._key(event_dict["c"], event_dict["o"])
+            if key not in seen:
+                seen.add(key)
                 cp_list.append(event_dict)
         
         return cp_list
+
+    def _implied_unsynthesizable(self, controllable, observable):
+        """
+        Removing controllable or observable events never makes a supervisor possible again, so a candidate
+        is unsynthesizable when it is contained in a pair that is already known to be unsynthesizable.
+        """
+        c, o = self._key(controllable, observable)
+        return any(c & ~fc == 0 and o & ~fo == 0 for fc, fo in self.unsynthesizable)
+
+    def _record_unsynthesizable(self, controllable, observable):
+        # only keep the maximal pairs, the others are implied by them
+        c, o = self._key(controllable, observable)
+        self.unsynthesizable = [(fc, fo) for fc, fo in self.unsynthesizable if not (fc & ~c == 0 and fo & ~o == 0)]
+        self.unsynthesizable.append((c, o))
     
     def minimize(self, minS, controllable, observable, preferred):
         """
@@ -164,32 +479,33 @@ class Repair:
         # gp_list is the set of good possibilities, initialize with nothing removed as a good possibility
         gp_list = [{"c": set(controllable), "o": set(observable), "minS": minS}]
 
+        try:
+            return self._minimize_steps(gp_list, actions_dict, preferred)
+        finally:
+            self._close_pool()
+
+    def _minimize_steps(self, gp_list, actions_dict, preferred):
         # By iterating i in range(3) we examine first the high cost events, then medium cost events, and then low cost events
         for i in range(3):
             # initialize the number of iterations when dealing with a priority group
             j = 0
             # continue adding events of a priority until it provides to be futile or it is impossible to add more
-            while (len(gp_list) != 0 and j < (len(actions_dict[i][0]) + len(actions_dict[i][1]))):
+            while (len(gp_list) != 0 and j < (len(actions_dict[i][0]) + len(actions_dict[i][1])) and not self._out_of_budget()):
                 j = j + 1 # iterate the counter for how many events have been removed of the current priority
 
                 last_gp_list = gp_list # save the gp_list, the list of good possibilities from the last iteration
                 p_list = self.next_possible_min_events(last_gp_list, actions_dict[i][0], actions_dict[i][1])    
                 gp_list = [] # initialize gp_list
-                # keep only the minimizations which work
-                for event_dict in p_list:
-                    if self.verbose:
-                        print("Minimizing with...")
-                        print("\tEc:", event_dict["c"])
-                        print("\tEo:", event_dict["o"])
-                    # synthesize with the appropriate controllable/observable events
-                    minS = self._synthesize(event_dict["c"], event_dict["o"]) 
-                    if minS == None:
-                        continue
-                    minS = self.lts2fsm(minS, event_dict["c"], event_dict["o"])
-                    # add minimization if preferred behavior maintained
-                    if set(self.check_preferred(minS, event_dict["c"], event_dict["o"], preferred)) == preferred:
-                        event_dict["minS"] = minS #update the minS
-                        gp_list.append(event_dict) 
+                with self.profiler.span("minimize.step", priority=i, step=j, candidates=len(p_list)) as span:
+                    # keep only the minimizations which work
+                    for event_dict, (minS, fulfilled) in zip(p_list, self._evaluate_candidates(p_list, preferred)):
+                        if minS == None:
+                            continue
+                        # add minimization if preferred behavior maintained
+                        if set(fulfilled) == preferred:
+                            event_dict["minS"] = self.lts2fsm(minS, event_dict["c"], event_dict["o"]) #update the minS
+                            gp_list.append(event_dict) 
+                    span.set(passed=len(gp_list))
 
             # if while loop was broken because no permissible minimization happened,
             # then use the saved minimizations as the best previous
@@ -202,12 +518,140 @@ class Repair:
         # # return the appropriate information
         # return best_minimization["minS"], list(best_minimization["c"]), list(best_minimization["o"])
 
-    def construct_supervisor(self, plant, sup_plant, controllable, observable):
-        # Convert Sp/G to a StateMachine object
-        sup_plant = self.fsm2lts(sup_plant, observable)
+    def _evaluate_candidate(self, controllable, observable, preferred):
+        """
+        Synthesize a supervisor for the given controllable and observable events and check which preferred
+        behavior it fulfills. Returns (minS, fulfilled, unknown), where minS is None when no supervisor exists,
+        and unknown is the reason why the candidate exceeded its budget (see Budget), otherwise None.
+        """
+        key = self._key(controllable, observable)
+        if key in self.unknown:
+            return None, [], self.unknown[key]
+        if self.verbose:
+            print("Minimizing with...")
+            print("\tEc:", controllable)
+            print("\tEo:", observable)
+        try:
+            # synthesize with the appropriate controllable/observable events
+            minS = self._synthesize(controllable, observable)
+            if minS == None:
+                return None, [], None
+            fulfilled = self.check_preferred(self.lts2fsm(minS, controllable, observable), controllable, observable, preferred)
+        except BudgetExceeded as e:
+            return None, [], str(e)
+        return minS, fulfilled, None
+
+    def _mark_unknown(self, controllable, observable, reason):
+        key = self._key(controllable, observable)
+        if key in self.unknown:
+            return
+        self.unknown[key] = reason
+        self.unknown_candidates.append({"controllable": sorted(controllable), "observable": sorted(observable), "reason": reason})
+        self.profiler.count("minimize.unknown")
+        print("Warning: candidate exceeded its budget and is unknown:", reason)
+        print("\tEc:", controllable)
+        print("\tEo:", observable)
+
+    def _open_pool(self):
+        """
+        Fork the worker pool on the first use within a minimize call, and reuse it for the following steps. The
+        workers keep the caches of the fork, the results of later steps are merged back into this instance only.
+        """
+        global _worker_repair
+        if self.pool == None:
+            _worker_repair = self
+            ctx = multiprocessing.get_context("fork")
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx, initializer=_init_worker)
+        return self.pool
+
+    def _close_pool(self, terminate=False):
+        """
+        Shut down the worker pool after its running calls, or with terminate True, kill the workers at once,
+        e.g. when the deadline is hit in the middle of a DESops call which cannot be interrupted otherwise.
+        """
+        global _worker_repair
+        if self.pool != None:
+            processes = list(self.pool._processes.values()) if terminate else []
+            self.pool.shutdown(wait=not terminate, cancel_futures=True)
+            for p in processes:
+                p.terminate()
+            for p in processes:
+                p.join()
+            self.pool = None
+            _worker_repair = None
+
+    def _evaluate_candidates(self, p_list, preferred):
+        """
+        Evaluate all the candidates of one minimization step, in order. With more than one worker, candidates
+        missing from the synthesis cache are checked by a pool of forked processes and their results are merged
+        back into the caches of this instance. Where fork is unavailable, they are evaluated one by one.
+        """
+        pruned = [self._implied_unsynthesizable(e["c"], e["o"]) for e in p_list]
+        self.pruned_candidates += sum(pruned)
+        self.profiler.count("minimize.pruned", sum(pruned))
+        pending = [e for e, skip in zip(p_list, pruned)
+                   if not skip and self._key(e["c"], e["o"]) not in self.synthesize_cache]
+        if self.workers > 1 and len(pending) > 1 and _can_fork():
+            # load the preferred behavior before forking so that workers do not need the helper JVM, and wait
+            # for the loader threads, which do not exist in the workers
+            for p in preferred:
+                self.fsp2lts(p)
+            self._wait_models()
+            if self.max_candidates != None:
+                # candidates beyond the limit would not be used
+                pending = pending[:max(0, self.max_candidates - self.evaluated_candidates)]
+            pool = self._open_pool()
+            futures = [pool.submit(_worker_evaluate, e["c"], e["o"], preferred) for e in pending]
+            for e, f in zip(pending, futures):
+                timeout = max(0, self.deadline - time.monotonic()) if self.deadline != None else None
+                if len(concurrent.futures.wait([f], timeout).done) == 0:
+                    # out of time, stop the workers instead of waiting for the candidates left in the pool
+                    self._close_pool(terminate=True)
+                    break
+                minS, fulfilled, unknown = f.result()
+                if unknown != None:
+                    self._mark_unknown(e["c"], e["o"], unknown)
+                    continue
+                key = self._key(e["c"], e["o"])
+                self.synthesize_cache[key] = minS
+                if minS != None:
+                    for p in preferred:
+                        self.check_preferred_cache[key + (p,)] = p in fulfilled
+
+        results = []
+        for e, skip in zip(p_list, pruned):
+            if self._out_of_budget():
+                # not evaluated, treat it as a failed candidate without recording it as unsynthesizable
+                results.append((None, []))
+                continue
+            if skip:
+                if self.verbose:
+                    print("Pruned unsynthesizable candidate...")
+                    print("\tEc:", e["c"])
+                    print("\tEo:", e["o"])
+                results.append((None, []))
+                continue
+            self.evaluated_candidates += 1
+            minS, fulfilled, unknown = self._evaluate_candidate(e["c"], e["o"], preferred)
+            if unknown != None:
+                # neither a solution nor unsynthesizable, so it must not prune other candidates
+                self._mark_unknown(e["c"], e["o"], unknown)
+            elif minS == None:
+                self._record_unsynthesizable(e["c"], e["o"])
+            results.append((minS, fulfilled))
+        return results
+
+    def construct_supervisor(self, plant, sup_plant, controllable, observable, budget=None):
+        # Convert Sp/G to a StateMachine object, unless it is already projected (see _synthesize)
+        if not isinstance(sup_plant, StateMachine):
+            sup_plant = self.fsm2lts(sup_plant, observable)
         # Hide the unobservable events in the plant and convert it to StateMachine object
-        plant = d.composition.observer(plant)
-        plant = self.fsm2lts(plant, observable)
+        if self.on_the_fly:
+            plant = self.plant.project(observable, budget)
+        else:
+            plant = d.composition.observer(plant)
+            self._check_budget(budget, plant)
+            plant = self.fsm2lts(plant, observable)
 
         qc, qg = [0], [0]
         new_trans = sup_plant.transitions.copy()
@@ -228,6 +672,40 @@ class Repair:
                 elif sg_p == None: # controllable but not defined in G, make redundant
                     new_trans.append([sc, sup_plant.alphabet.index(a), sc])
         return StateMachine("sup", new_trans, sup_plant.alphabet, sup_plant.accept)
+
+    def _minimize_lts(self, m, where):
+        """
+        Minimize a deterministic StateMachine when minimize_automata is set, and record the reduction.
+        """
+        if not self.minimize_automata:
+            return m
+        minimal = m.minimize()
+        before, after = len(m.all_states()), len(minimal.all_states())
+        stats = self.minimization_stats.setdefault(where, {"calls": 0, "states_before": 0, "states_after": 0})
+        stats["calls"] += 1
+        stats["states_before"] += before
+        stats["states_after"] += after
+        self.profiler.count(f"minimize_automata.{where}.removed_states", before - after)
+        if self.verbose and before != after:
+            print(f"Minimized {where} result from {before} to {after} states")
+        return minimal
+
+    def _minimize_dfa(self, g, where):
+        """
+        Minimize a DESops DFA by converting it to a StateMachine, keeping its controllable/observable labelling.
+        """
+        if not self.minimize_automata or type(g) == igraph.Graph or len(g.vs) == 0:
+            return g
+        names = lambda events: set(str(getattr(e, "label", e)) for e in events)
+        controllable = names(g.events) - names(g.Euc)
+        observable = names(g.events) - names(g.Euo)
+        m = self._minimize_lts(StateMachine.from_dfa(g), where)
+        minimal = m.to_dfa(controllable, observable)
+        # keep the events which do not label any transition after minimization
+        minimal.events = g.events.copy()
+        minimal.Euc = g.Euc.copy()
+        minimal.Euo = g.Euo.copy()
+        return minimal
     
     def compute_weights(self):
         """
@@ -296,143 +774,377 @@ class Repair:
         """
         #initialize cost and utility
         preferred = sum(map(lambda x: weight_dict[x], preferred_behavior))
-        cost = sum(map(lambda x: weight_dict[x][0], min_controllable)) +\
-               sum(map(lambda x: weight_dict[x][1], min_observable))        
+        cost = self._mask_cost(self._mask(min_controllable), weight_dict, 0) +\
+               self._mask_cost(self._mask(min_observable), weight_dict, 1)
         return preferred, cost 
+
+    def _mask_cost(self, mask, weight_dict, w):
+        """
+        The total cost of the events of a bitmask, where w is 0 for the controllable and 1 for the observable
+        cost of weight_dict. Only the set bits are visited.
+        """
+        cost = 0
+        while mask != 0:
+            low = mask & -mask
+            cost += weight_dict[self.indexed_events[low.bit_length() - 1]][w]
+            mask ^= low
+        return cost
     
     def check_preferred(self, minS, controllable, observable, preferred):
         """
         Given some minimum supervisor, a set of controllable events, a set of observable events, 
         and a set of preferred behavior, checks how much preferred behavior is satisfied
         """
-        fulfilled_preferred = []
+        if self.result_store == None:
+            return self._check_preferred(minS, controllable, observable, preferred)
 
-        M_prime = self.compose_M_prime(minS, controllable, observable)
+        # load the outcomes of earlier runs, and store the ones computed by this run
+        store_keys = {}
+        for p in preferred:
+            key = self._key(controllable, observable) + (p,)
+            if key in self.check_preferred_cache:
+                continue
+            with open(p, "rb") as f:
+                source = f.read()
+            store_keys[p] = self.result_store.key("preferred", controllable, observable, source,
+                                                  f"lazy_inclusion={self.lazy_inclusion}")
+            obj = self.result_store.get(store_keys[p])
+            if obj != None:
+                self.profiler.count("check_preferred.store_hit")
+                self.check_preferred_cache[key] = obj["fulfilled"]
+                self.preferred_counterexamples[key] = obj["counterexample"]
+                del store_keys[p]
 
-        env = list(map(lambda x: self.lts2fsm(x, controllable, observable), self.env_p))
-        env = env[0] if len(env) == 1 else d.composition.parallel(*env)
-        M_prime = d.composition.parallel(M_prime, env)
+        fulfilled_preferred = self._check_preferred(minS, controllable, observable, preferred)
+        for p, store_key in store_keys.items():
+            key = self._key(controllable, observable) + (p,)
+            self.result_store.put(store_key, {
+                "fulfilled": p in fulfilled_preferred,
+                "counterexample": self.preferred_counterexamples.get(key)
+            })
+        return fulfilled_preferred
+
+    def _check_preferred(self, minS, controllable, observable, preferred):
+        fulfilled_preferred = []
+        M_prime = None
+        budget = self._budget()
+
+        if self.lazy_inclusion and self.single_pass:
+            # read the cached outcomes first, the cache may evict them while the others are stored
+            outcomes = {}
+            for p in preferred:
+                key = self._key(controllable, observable) + (p,)
+                if key in self.check_preferred_cache:
+                    outcomes[p] = self.check_preferred_cache[key]
+            pending = [p for p in preferred if p not in outcomes]
+            if len(pending) > 0:
+                with self.profiler.span("check_preferred", preferred=len(pending), lazy=True, single_pass=True) as span:
+                    traces = self._preferred_violations(minS, pending, controllable, observable, budget)
+                    for p, trace in zip(pending, traces):
+                        key = self._key(controllable, observable) + (p,)
+                        self._count_cache("check_preferred", False)
+                        outcomes[p] = trace == None
+                        self.check_preferred_cache[key] = trace == None
+                        self.preferred_counterexamples[key] = trace
+                        if trace != None and self.verbose:
+                            print("Preferred behavior", p, "violated by:", trace)
+                    span.set(fulfilled=traces.count(None))
+            for p in preferred:
+                key = self._key(controllable, observable) + (p,)
+                if p not in pending:
+                    self._count_cache("check_preferred", True)
+                    if self.verbose and outcomes[p]:
+                        print("Check preferred cache hit:", key)
+                if outcomes[p]:
+                    fulfilled_preferred.append(p)
+            return fulfilled_preferred
 
         for p in preferred:
-            key = (tuple(controllable), tuple(observable), p)
+            key = self._key(controllable, observable) + (p,)
             if key in self.check_preferred_cache:
+                self._count_cache("check_preferred", True)
                 if self.check_preferred_cache[key]:
                     fulfilled_preferred.append(p)
                     if self.verbose:
                         print("Check preferred cache hit:", key)
                 continue
-            self.check_preferred_cache[key] = False
+            self._count_cache("check_preferred", False)
 
-            p_fsm = self.fsp2fsm(p, controllable, observable)
-            M_prime.Euo = p_fsm.Euo.union(M_prime.events - p_fsm.events)
-            M_prime.Euc = p_fsm.Euc.union(M_prime.events - p_fsm.events)
-            M_prime_observed = d.composition.observer(M_prime) # seems to have performance issue :C
-            if d.compare_language(d.composition.parallel(M_prime_observed, p_fsm), p_fsm):
-                fulfilled_preferred.append(p)
-                self.check_preferred_cache[key] = True
+            if self.lazy_inclusion:
+                with self.profiler.span("check_preferred", preferred=p, lazy=True) as span:
+                    trace = self._preferred_violation(minS, p, controllable, observable, budget)
+                    self.preferred_counterexamples[key] = trace
+                    self.check_preferred_cache[key] = trace == None
+                    if trace == None:
+                        fulfilled_preferred.append(p)
+                    elif self.verbose:
+                        print("Preferred behavior", p, "violated by:", trace)
+                    span.set(fulfilled=self.check_preferred_cache[key])
+                continue
+
+            with self.profiler.span("check_preferred", preferred=p) as span:
+                # only build M'||E when some preferred behavior is not cached
+                if M_prime == None:
+                    M_prime = self._compose_M_prime_env(minS, controllable, observable)
+                    self._check_budget(budget, M_prime)
+                p_fsm = self._preferred_fsm(p, controllable, observable)
+                M_prime_observed = self._observe_M_prime(M_prime, p_fsm, controllable, observable)
+                self._check_budget(budget, M_prime_observed)
+                # only cache the outcome once it is known, a call may stop with BudgetExceeded
+                self.check_preferred_cache[key] = d.compare_language(d.composition.parallel(M_prime_observed, p_fsm), p_fsm)
+                if self.check_preferred_cache[key]:
+                    fulfilled_preferred.append(p)
+                if self.profiler.enabled:
+                    span.set(
+                        fulfilled=self.check_preferred_cache[key],
+                        M_prime_states=len(M_prime.vs), observed_states=len(M_prime_observed.vs)
+                    )
 
         return fulfilled_preferred
     
-    def next_least_to_remove(self, D_max):
+    def _preferred_violation(self, minS, p, controllable, observable, budget=None):
+        """
+        Search M'||E = sys||sup||env_p lazily for a trace of the preferred behavior p that it cannot perform.
+        Returns None when p is fulfilled, otherwise the violating trace.
+        """
+        return self._preferred_violations(minS, [p], controllable, observable, budget)[0]
+
+    def _preferred_violations(self, minS, preferred, controllable, observable, budget=None):
+        """
+        The violating trace, or None, of each preferred behavior, searched in one exploration of M'||E.
+        """
+        key = self._key(controllable, observable)
+        if key not in self.sup_lts_cache:
+            # FIXME: when sup is an empty controller, it returns a Graph object instead of DFA
+            empty = type(minS) == igraph.Graph or len(minS.vs) == 0
+            self.sup_lts_cache[key] = None if empty else self.fsm2lts(minS, name="sup")
+        sup = self.sup_lts_cache[key]
+        if sup == None:
+            # M' has no behavior at all
+            return [[] for _ in preferred]
+        ps = [self.fsp2lts(p) for p in preferred]
+        # the hidden events of the LTSA plant are outside alphabet, so they are never visible to p
+        machines = [self.plant, sup] if self.ltsa_plant else self.sys + [sup] + self.env_p
+        return find_violations(ps, machines, observable, budget)
+
+    def _compose_M_prime_env(self, minS, controllable, observable):
+        """
+        Compose M' with the deviated environment, cached per controllable and observable events.
+        """
+        key = self._key(controllable, observable)
+        if key not in self.M_prime_env_cache:
+            M_prime = self.compose_M_prime(minS, controllable, observable)
+            env = list(map(lambda x: self.lts2fsm(x, controllable, observable), self.env_p))
+            env = env[0] if len(env) == 1 else d.composition.parallel(*env)
+            self.M_prime_env_cache[key] = d.composition.parallel(M_prime, env)
+        return self.M_prime_env_cache[key]
+
+    def _preferred_fsm(self, p, controllable, observable):
+        key = (p,) + self._key(controllable, observable)
+        if key not in self.preferred_fsm_cache:
+            self.preferred_fsm_cache[key] = self.fsp2fsm(p, controllable, observable)
+        return self.preferred_fsm_cache[key]
+
+    def _observe_M_prime(self, M_prime, p_fsm, controllable, observable):
+        """
+        Project M'||E to the alphabet of a preferred behavior. The observer only depends on the
+        unobservable events, so preferred behavior sharing an alphabet share one projection.
+        """
+        Euo = p_fsm.Euo.union(M_prime.events - p_fsm.events)
+        key = self._key(controllable, observable) + (frozenset(Euo),)
+        if key not in self.observer_cache:
+            M_prime.Euo = Euo
+            M_prime.Euc = p_fsm.Euc.union(M_prime.events - p_fsm.events)
+            self.observer_cache[key] = d.composition.observer(M_prime) # seems to have performance issue :C
+        return self.observer_cache[key]
+
+    def next_least_to_remove(self, D_max, weight_dict=None):
+        """
+        Enumerate the brackets of preferred behavior to give up, as lists of removal sets, best first: a bracket
+        removing i Essential, j Important, and k Minor behaviors is ordered by the utility it loses. With the
+        tiered weights from compute_weights, this is the same order as removing Essential, then Important, then
+        Minor behavior lexicographically.
+        """
+        if weight_dict == None:
+            weight_dict = self.compute_weights()
         # trim out the preferred behaviors that could never be satisfied
         l1 = [d for d in self.preferred[PRIORITY1] if d in D_max]
         l2 = [d for d in self.preferred[PRIORITY2] if d in D_max]
         l3 = [d for d in self.preferred[PRIORITY3] if d in D_max]
-        for i in range(len(l3) + 1):
-            for j in range(len(l2) + 1):
-                for k in range(len(l1) + 1):
-                    print(f"Weaken the preferred behavior by {i} Essential, {j} Important, and {k} Minor...")
-                    D_rm_set = []
-                    # for this partition of lost behavior, find all possible subsets from each category
-                    beh_1_subsets = itertools.combinations(l1, k)
-                    beh_2_subsets = itertools.combinations(l2, j)
-                    beh_3_subsets = itertools.combinations(l3, i)
-                    for l in beh_1_subsets:
-                        for m in beh_2_subsets:
-                            for o in beh_3_subsets:
-                                D_rm_set.append(l + m + o)
-                    yield D_rm_set
-            
-    def synthesize(self, n):
+        # behaviors in the same tier have the same weight
+        w1, w2, w3 = [weight_dict[l[0]] if len(l) > 0 else 0 for l in (l1, l2, l3)]
+
+        heap = [(0, (0, 0, 0))]
+        seen = set([(0, 0, 0)])
+        while len(heap) > 0:
+            _, (i, j, k) = heapq.heappop(heap)
+            print(f"Weaken the preferred behavior by {i} Essential, {j} Important, and {k} Minor...")
+            # for this partition of lost behavior, find all possible subsets from each category
+            beh_1_subsets = list(itertools.combinations(l1, k))
+            beh_2_subsets = list(itertools.combinations(l2, j))
+            beh_3_subsets = list(itertools.combinations(l3, i))
+            yield [l + m + o for l in beh_1_subsets for m in beh_2_subsets for o in beh_3_subsets]
+
+            for b in [(i + 1, j, k), (i, j + 1, k), (i, j, k + 1)]:
+                if b[0] <= len(l3) and b[1] <= len(l2) and b[2] <= len(l1) and b not in seen:
+                    seen.add(b)
+                    heapq.heappush(heap, (b[0] * w3 + b[1] * w2 + b[2] * w1, b))
+
+    def cost_bound(self, controllable, weight_dict):
+        """
+        An upper bound of the cost of any solution found by minimize from the given controllable events: at least
+        one controllable event is kept, and it stays observable.
+        """
+        if len(controllable) == 0:
+            return 0
+        return max(weight_dict[a][0] + weight_dict[a][1] for a in controllable)
+
+    def _out_of_budget(self):
+        if self.deadline != None and time.monotonic() >= self.deadline:
+            return True
+        return self.max_candidates != None and self.evaluated_candidates >= self.max_candidates
+
+    def synthesize(self, n, timeout=None, max_candidates=None):
         """
         Given maximum number n of depth to search, return a list of solutions, prioritizng fulfillment of preferred behavior.
+        See synthesize_iter for the budget.
         """
-        # collect all preferred behavior
-        preferred = []
-        for key in self.preferred:
-            preferred.extend(self.preferred[key])
+        return list(self.synthesize_iter(n, timeout, max_candidates))
 
-        # find dictionary of weights by actions, preferred behavior and weights assigned by tiers
-        weight_dict = self.compute_weights()
+    def synthesize_iter(self, n, timeout=None, max_candidates=None):
+        """
+        The same search as synthesize, but yields each new pareto-optimal solution as soon as it is found.
+        The search stops after timeout seconds or after evaluating max_candidates candidates in minimize,
+        yielding the solutions found so far; budget_exhausted tells whether it stopped early.
+        """
+        self.deadline = time.monotonic() + timeout if timeout != None else None
+        self.max_candidates = self.evaluated_candidates + max_candidates if max_candidates != None else None
+        self.budget_exhausted = False
 
-        # first synthesize with all aphabet, then find supervisor, then remove unecessary actions, and check which preferred behavior are satisfied
-        alphabet = self.alphabet
-        sup = self._synthesize(alphabet, alphabet)
-        if sup == None:
-            print("Warning: Hard constraint progress property cannot be satisfied.")
-            return []
-        minS, controllable, observable = self.remove_unnecessary(sup, alphabet, alphabet)
-        D_max = self.check_preferred(minS, controllable, observable, preferred)
-        print("Maximum fulfilled preferred behavior:", D_max)
-
-        # initialize list of controllers
-        controllers = []
-        # initialize the least cost experienced overall as a very negative cost, this stands for -infinity
-        min_cost = -1_000_000_000
-        # intialize number of controllers considered
-        t = 0
-        for D_rm_sets in self.next_least_to_remove(D_max):
-            if t >= n:
-                break
-            t += 1
-            # initialize the best cost for this amount of preferred behaviornot satisfied to be a very negative cost, this stands for -infinity
-            min_cost_bracket = -1_000_000_000
-            possible_controllers = []
-            for remove_behavior in D_rm_sets:
-                # remove behavior that we don't care about anymore
-                D_max_subset = set(D_max) - set(remove_behavior)
-                # find result that is found by minimizing
-                for sup, min_controllable, min_observable in self.minimize(minS, controllable, observable, D_max_subset):
-                    # compute the total utility and the cost of such a minimization
-                    # FIXME: cost only need to compute once
-                    utility_preferred, cost = self.compute_util_cost(D_max_subset, min_controllable, min_observable, weight_dict)
-                    # check how cost of of this set of removed preferred behavior compares with the best cost thus far
-                    if cost < min_cost_bracket: # if cost is worse than best, then ignore it
-                        continue
-                    else:
-                        result = {
-                            "M_prime": sup,
-                            "controllable": min_controllable,
-                            "observable": min_observable, 
-                            "preferred": D_max_subset,
-                            "preferred_utility": utility_preferred,
-                            "cost": cost
-                        }
-                        if cost > min_cost_bracket: # if cost is better, then clear out all others, update best cost and then start a new list
-                            min_cost_bracket = cost
-                            possible_controllers = [result]
-                        else: # if cost is same as best, then add to list
-                            possible_controllers.append(result)
-            # if the best cost among these subsets exceeds prior best cost add to controllers 
-            if min_cost_bracket > min_cost:
-                min_cost = min_cost_bracket
-                controllers.extend(possible_controllers)
-                for c in possible_controllers:
-                    print("New pareto-optimal found:")
-                    print("\tEc:", c["controllable"])
-                    print("\tEo:", c["observable"])
-                    print("\tPreferred:", c["preferred"])
-                    print("\tPreferred Utility:", c["preferred_utility"])
-                    print("\tCost:", c["cost"])
-            else:
-                print("No new pareto-optimal solution found.")
+        try:
+            # collect all preferred behavior
+            preferred = []
+            for key in self.preferred:
+                preferred.extend(self.preferred[key])
 
-        # composes Mprime for all once we know that these are what we want and updates
-        for controller in controllers:
-            controller["M_prime"] = self.compose_M_prime(controller["M_prime"], controller["controllable"], controller["observable"])
+            # find dictionary of weights by actions, preferred behavior and weights assigned by tiers
+            weight_dict = self.compute_weights()
 
-        # returns all controllers
-        return controllers
+            # first synthesize with all aphabet, then find supervisor, then remove unecessary actions, and check which preferred behavior are satisfied
+            alphabet = self.alphabet
+            try:
+                # the events removed by remove_unnecessary depend on the states of the supervisor, so it gets the
+                # one which is not minimized, whatever minimize_automata is
+                sup = self._synthesize(alphabet, alphabet, minimal=False)
+                if sup == None:
+                    print("Warning: Hard constraint progress property cannot be satisfied.")
+                    return
+                minS, controllable, observable = self.remove_unnecessary(sup, alphabet, alphabet)
+                D_max = self.check_preferred(minS, controllable, observable, preferred)
+            except BudgetExceeded as e:
+                self._mark_unknown(alphabet, alphabet, str(e))
+                print("Warning: the initial synthesis exceeded its budget, no result can be found.")
+                return
+            print("Maximum fulfilled preferred behavior:", D_max)
+
+            # initialize the least cost experienced overall as a very negative cost, this stands for -infinity
+            min_cost = -1_000_000_000
+            # no solution can be cheaper than this, so the search stops once the pareto front reaches it
+            cost_bound = self.cost_bound(controllable, weight_dict)
+            n_brackets = 1
+            for key in [PRIORITY1, PRIORITY2, PRIORITY3]:
+                n_brackets *= len([d for d in self.preferred[key] if d in D_max]) + 1
+            self.brackets_explored, self.brackets_skipped = 0, 0
+            # costs of the (controllable, observable) pairs returned by minimize
+            cost_cache = {}
+            # intialize number of controllers considered
+            t = 0
+            for D_rm_sets in self.next_least_to_remove(D_max, weight_dict):
+                if t >= n:
+                    break
+                if self._out_of_budget():
+                    break
+                if min_cost >= cost_bound:
+                    # bound: the remaining brackets lose utility and cannot reach a strictly better cost
+                    self.brackets_skipped = n_brackets - self.brackets_explored
+                    print("Remaining brackets cannot improve the pareto front, skipped:", self.brackets_skipped)
+                    break
+                t += 1
+                self.brackets_explored += 1
+                # candidates of this bracket which exceeded their budget, reported with its results
+                n_unknown = len(self.unknown_candidates)
+                # initialize the best cost for this amount of preferred behaviornot satisfied to be a very negative cost, this stands for -infinity
+                min_cost_bracket = -1_000_000_000
+                possible_controllers = []
+                for remove_behavior in D_rm_sets:
+                    if self._out_of_budget():
+                        break
+                    # remove behavior that we don't care about anymore
+                    D_max_subset = set(D_max) - set(remove_behavior)
+                    # find result that is found by minimizing
+                    for sup, min_controllable, min_observable in self.minimize(minS, controllable, observable, D_max_subset):
+                        # compute the total utility and the cost of such a minimization
+                        cost_key = self._key(min_controllable, min_observable)
+                        if cost_key not in cost_cache:
+                            cost_cache[cost_key] = self.compute_util_cost(D_max_subset, cost_key[0], cost_key[1], weight_dict)[1]
+                        cost = cost_cache[cost_key]
+                        utility_preferred = sum(map(lambda x: weight_dict[x], D_max_subset))
+                        # check how cost of of this set of removed preferred behavior compares with the best cost thus far
+                        if cost < min_cost_bracket: # if cost is worse than best, then ignore it
+                            continue
+                        else:
+                            result = {
+                                "M_prime": sup,
+                                "controllable": min_controllable,
+                                "observable": min_observable, 
+                                "preferred": D_max_subset,
+                                "preferred_utility": utility_preferred,
+                                "cost": cost,
+                                "unknown": []
+                            }
+                            if cost > min_cost_bracket: # if cost is better, then clear out all others, update best cost and then start a new list
+                                min_cost_bracket = cost
+                                possible_controllers = [result]
+                            else: # if cost is same as best, then add to list
+                                possible_controllers.append(result)
+                # if the best cost among these subsets exceeds prior best cost add to controllers 
+                # (when the budget ran out in this bracket, these are the best of the subsets explored so far)
+                if min_cost_bracket > min_cost:
+                    min_cost = min_cost_bracket
+                    for c in possible_controllers:
+                        print("New pareto-optimal found:")
+                        print("\tEc:", c["controllable"])
+                        print("\tEo:", c["observable"])
+                        print("\tPreferred:", c["preferred"])
+                        print("\tPreferred Utility:", c["preferred_utility"])
+                        print("\tCost:", c["cost"])
+                        # composes Mprime once we know that this is what we want
+                        c["M_prime"] = self.compose_M_prime(c["M_prime"], c["controllable"], c["observable"])
+                        # a cheaper solution may hide among the candidates that exceeded their budget
+                        c["unknown"] = self.unknown_candidates[n_unknown:]
+                        if len(c["unknown"]) > 0:
+                            print("\tUnknown candidates (budget exceeded):", len(c["unknown"]))
+                        yield c
+                else:
+                    print("No new pareto-optimal solution found.")
+
+            if len(self.unknown_candidates) > 0:
+                print("Candidates unknown because they exceeded their budget:", len(self.unknown_candidates))
+            # the statistics are also kept in the attributes and cache_stats, e.g. for benchmark.py
+            if self.verbose:
+                print("Candidates pruned as unsynthesizable:", self.pruned_candidates)
+                for name, stats in self.cache_stats().items():
+                    if "hits" in stats:
+                        print(f"Cache {name}: {stats['hits']} hits, {stats['misses']} misses")
+                print(f"Brackets explored: {self.brackets_explored}, skipped: {self.brackets_skipped}")
+                for where, stats in self.minimization_stats.items():
+                    print(f"Minimized {stats['calls']} {where} results from {stats['states_before']} to {stats['states_after']} states")
+            if self._out_of_budget():
+                self.budget_exhausted = True
+                print("Warning: search budget exhausted, the results may not be complete.")
+        finally:
+            # the limits apply to this search only, also when the caller stops iterating early
+            self.deadline, self.max_candidates = None, None
 
     def compose_M_prime(self, sup, controllable, observable):
         """
@@ -448,102 +1160,138 @@ class Repair:
             M_prime.Euo = M.Euo.copy()
             return M_prime
         M_prime = d.composition.parallel(M, sup)
-        return M_prime
+        return self._minimize_dfa(M_prime, "compose_M_prime")
     
     def make_progress_prop(self, e):
-        fsm = "2\n\n" +\
-              "State0\t0\t1\n" +\
-              f"{e}\tState1\tc\to\n\n" +\
-              "State1\t1\t1\n" +\
-              f"{e}\tState1\tc\to\n"
-        with open(f"tmp/{e}.fsm", "w") as f:
-            f.write(fsm)
-        return d.read_fsm(f"tmp/{e}.fsm")
+        m = StateMachine(e, [[0, 0, 1], [1, 0, 1]], [e], {1})
+        return m.to_dfa([e], [e])
 
     def file2fsm(self, file, controllable, observable, extend_alphabet=False):
-        name = path.basename(file)
         if file.endswith(".lts"):
             return self.fsp2fsm(file, controllable, observable, extend_alphabet)
         elif file.endswith(".fsm"):
             if extend_alphabet:
                 m = StateMachine.from_fsm(file)
-                return self.lts2fsm(m, controllable, observable, extend_alphabet=extend_alphabet, name=name)
+                return self.lts2fsm(m, controllable, observable, extend_alphabet=extend_alphabet)
             else:
                 return d.read_fsm(file)
         elif file.endswith(".json"):
             m = StateMachine.from_json(file)
-            return self.lts2fsm(m, controllable, observable, extend_alphabet=extend_alphabet, name=name)
+            return self.lts2fsm(m, controllable, observable, extend_alphabet=extend_alphabet)
         else:
             raise Exception("Unknown input file type")
     
-    def lts2fsm(self, m, controllable, observable, name=None, extend_alphabet=False):
+    def lts2fsm(self, m, controllable, observable, extend_alphabet=False):
         if extend_alphabet:
             m = m.extend_alphabet(self.alphabet)
-        tmp = f"tmp/{name}.fsm" if name != None else f"tmp/tmp.{random() * 1000_000}.fsm"
-        m.to_fsm(controllable, observable, tmp)
-        return d.read_fsm(tmp)
+        return m.to_dfa(controllable, observable)
 
     def fsp2fsm(self, file, controllable, observable, extend_alphabet=False):
-        name = path.basename(file)
         m = self.fsp2lts(file)
-        return self.lts2fsm(m, controllable, observable, extend_alphabet=extend_alphabet, name=name)
+        return self.lts2fsm(m, controllable, observable, extend_alphabet=extend_alphabet)
     
     def fsm2lts(self, obj, alphabet=None, name=None, extend_alphabet=False):
-        tmp = f"tmp/{name}.fsm" if name != None else f"tmp/tmp.{random() * 1000_000}.fsm"
-        d.write_fsm(tmp, obj)
-        m = StateMachine.from_fsm(tmp, alphabet)
+        m = StateMachine.from_dfa(obj, alphabet, name if name != None else "tmp")
         if extend_alphabet:
             m = m.extend_alphabet(self.alphabet)
         return m
     
     def fsm2fsp(self, obj, alphabet=None, name=None):
         m = self.fsm2lts(obj, alphabet, name)
-        tmp = f"tmp/{name}.json" if name != None else f"tmp/tmp.{random() * 1000_000}.json"
+        tmp = path.join(self.work_dir, f"{name}.json" if name != None else f"tmp.{random() * 1000_000}.json")
         m.to_json(tmp)
-        lts = subprocess.check_output([
-            "java",
-            "-jar",
-            path.join(this_file, "./bin/ltsa-helper.jar"),
-            "convert",
-            "--json",
-            tmp,
-        ], text=True)
-        return lts
+        return self.helper.call("convert", "--json", tmp)
     
     def fsp2lts(self, file):
         if file in self.fsp_cache:
+            self._count_cache("fsp", True)
             return self.fsp_cache[file]
+        self._count_cache("fsp", False)
 
-        print(f"Read {file}...")
-        name = path.basename(file)
-        tmp_json = f"tmp/{name}.json"
-        with open(tmp_json, "w") as f:
-            subprocess.run([
-                "java",
-                "-jar",
-                path.join(this_file, "./bin/ltsa-helper.jar"),
-                "convert",
-                "--lts",
-                file,
-            ], stdout=f)
-        self.fsp_cache[file] = StateMachine.from_json(tmp_json)
+        if file in self.model_futures:
+            with self.profiler.span("fsp.wait", file=file):
+                self.fsp_cache[file] = self.model_futures.pop(file).result()
+            if len(self.model_futures) == 0:
+                # the loader is only used by __init__, so its helper JVMs are not needed anymore
+                self.loader.close()
+        else:
+            self.fsp_cache[file] = self._load_model(self.helper, file)
         return self.fsp_cache[file]
-    
+
+    def _load_model(self, helper, file):
+        """
+        Load a model file as a StateMachine, compiling FSP files with the given helper unless they are in the
+        compiled model cache. It may run on a loader thread, so it does not touch the in-memory caches.
+        """
+        if file.endswith(".json"):
+            return StateMachine.from_json(file)
+        if file.endswith(".ltsb"):
+            return StateMachine.from_binary(file)
+
+        obj, key = None, None
+        if self.model_cache != None:
+            with open(file, "rb") as f:
+                key = self.model_cache.key(f.read())
+            obj = self.model_cache.get(key)
+        self.profiler.count("fsp.disk_hit" if obj != None else "fsp.disk_miss")
+        if obj == None:
+            print(f"Read {file}...")
+            obj = json.loads(helper.call("convert", "--lts", file))
+            if key != None:
+                self.model_cache.put(key, obj)
+        elif self.verbose:
+            print(f"Read {file} from cache")
+        return StateMachine.from_json_obj(obj)
+
+    def compose_plant(self, files):
+        """
+        Compose the model files with LTSA, minimised with the events outside alphabet hidden as tau, and
+        return the result as a deterministic StateMachine without tau. The result is kept in the compiled
+        model cache.
+        """
+        obj, key = None, None
+        if self.model_cache != None:
+            sources = []
+            for file in files:
+                with open(file, "rb") as f:
+                    sources.append(f.read())
+            key = self.model_cache.key("compose", ",".join(sorted(self.alphabet)), *sources)
+            obj = self.model_cache.get(key)
+        if obj == None:
+            print("Compose", files, "with LTSA...")
+            with self.profiler.span("compose_plant", files=len(files)):
+                obj = json.loads(self.helper.call("compose", "-a", ",".join(sorted(self.alphabet)), *files))
+            if key != None:
+                self.model_cache.put(key, obj)
+        elif self.verbose:
+            print("Read the composed plant from cache")
+        plant = StateMachine.from_json_obj(obj)
+        if "_tau_" in plant.used_events() or not plant.is_deterministic():
+            # the synthesis expects a deterministic plant, which compose results of older helpers are not
+            plant = plant.project([a for a in plant.alphabet if a != "_tau_"])
+        if self.verbose:
+            print("LTSA plant:", len(plant.all_states()), "states,", len(plant.transitions), "transitions")
+        return plant
+
     @staticmethod
-    def abstract(file, abs_set):
+    def abstract(file, abs_set, helper=None, work_dir="tmp"):
+        """
+        Abstract the model file by the events abs_set and return the JSON file written into work_dir. A
+        Repair instance can pass its helper and work_dir, otherwise a one-shot helper process is used.
+        """
         print("Abstract", file, "by", abs_set)
         name = path.basename(file)
-        tmp_json = f"tmp/abs_{name}.json"
+        tmp_json = path.join(work_dir, f"abs_{name}.json")
+        if helper == None:
+            helper = LTSAHelper(persistent=False)
         with open(tmp_json, "w") as f:
-            subprocess.run([
-                "java",
-                "-jar",
-                path.join(this_file, "./bin/ltsa-helper.jar"),
-                "abstract",
-                "-m",
-                file,
-                "-f",
-                "json",
-                *abs_set
-            ], stdout=f)
+            f.write(helper.call("abstract", "-m", file, "-f", "json", *abs_set))
         return tmp_json
+
+    def close(self):
+        """
+        Stop the LTSA helper workers of this instance.
+        """
+        if self.loader != None:
+            self.loader.close()
+        self.helper.close()
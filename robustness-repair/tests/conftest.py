@@ -0,0 +1,5 @@
+import sys
+from os import path
+
+# the modules of robustness-repair are flat and imported by name, as models/*/run.py does
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
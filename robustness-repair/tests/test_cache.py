@@ -0,0 +1,83 @@
+import os
+
+from cache import LRUCache, MemoryBudget, approx_size
+from lts import StateMachine, CSRTransitions
+
+
+def machine(n):
+    return StateMachine(f"m{n}", [[i, 0, i + 1] for i in range(n)], ["a"], {0})
+
+
+def test_evicts_least_recently_used():
+    size = approx_size(machine(10))
+    cache = LRUCache("test", max_bytes=2 * size)
+    cache[1] = machine(10)
+    cache[2] = machine(10)
+    cache[1]
+    cache[3] = machine(10)
+    # 2 was used least recently and is dropped without a spill directory
+    assert 2 not in cache and 1 in cache and 3 in cache
+    assert cache.stats()["evictions"] == 1 and cache.bytes == 2 * size
+
+
+def test_keeps_newest_entry():
+    cache = LRUCache("test", max_bytes=1)
+    cache[1] = machine(10)
+    cache[2] = machine(20)
+    assert len(cache) == 1 and cache[2].name == "m20"
+
+
+def test_unbounded():
+    cache = LRUCache("test")
+    for i in range(100):
+        cache[i] = machine(i)
+    assert len(cache) == 100 and cache.stats()["evictions"] == 0
+
+
+def test_spill_and_reload(tmp_path):
+    spill_dir = str(tmp_path / "spill")
+    size = approx_size(machine(10))
+    cache = LRUCache("test", max_bytes=size, spill_dir=spill_dir)
+    cache[1] = machine(10)
+    cache[2] = machine(10)
+    cache[3] = None
+    assert cache.stats()["spills"] == 2 and len(os.listdir(spill_dir)) == 2
+    assert sorted(cache.keys()) == [1, 2, 3]
+
+    m = cache[1]
+    # reloaded from the binary format, and the file is removed once it is mapped
+    assert isinstance(m.transitions, CSRTransitions)
+    assert list(m.transitions) == machine(10).transitions and m.accept == {0}
+    assert cache.stats()["reloads"] == 1 and len(os.listdir(spill_dir)) == 1
+    # a mapped machine is smaller than one in lists
+    assert approx_size(m) < size
+
+    cache[4] = machine(10)
+    # None is not a StateMachine, so it is dropped instead of spilled
+    assert 3 not in cache and 1 in cache and len(os.listdir(spill_dir)) == 2
+
+    cache.discard(2)
+    assert 2 not in cache and len(os.listdir(spill_dir)) == 1
+
+
+def test_shared_budget():
+    size = approx_size(machine(10))
+    budget = MemoryBudget(2 * size)
+    a = LRUCache("a", budget=budget)
+    b = LRUCache("b", budget=budget)
+    a[1] = machine(10)
+    b[1] = machine(10)
+    a[1]
+    b[2] = machine(10)
+    # the limit holds for both caches together, and b[1] was used least recently among them
+    assert 1 in a and 1 not in b and 2 in b
+    assert budget.bytes == a.bytes + b.bytes == 2 * size
+    a.discard(1)
+    assert budget.bytes == size
+
+
+def test_size_counts_index():
+    m = machine(10)
+    size = approx_size(m)
+    # the index is built when the size is estimated, so that using the value does not grow it unnoticed
+    assert m._table != None and size > 100 * len(m.transitions)
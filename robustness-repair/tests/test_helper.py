@@ -0,0 +1,13 @@
+from helper import ResultStore
+
+
+def test_result_store_binary_sources(tmp_path):
+    # .ltsb models are hashed as bytes, which need not be valid UTF-8
+    model_key = ResultStore.model_key("sys:", b"LTSB\x01\x00\xff")
+    assert model_key != ResultStore.model_key("sys:", b"LTSB\x01\x00\xfe")
+    store = ResultStore(str(tmp_path), model_key)
+    key = store.key("preferred", {"b", "a"}, ["a"], b"\xff\xfe", "lazy_inclusion=True")
+    assert key == store.key("preferred", ["a", "b"], {"a"}, b"\xff\xfe", "lazy_inclusion=True")
+    assert store.get(key) == None
+    store.put(key, {"fulfilled": True})
+    assert store.get(key) == {"fulfilled": True}
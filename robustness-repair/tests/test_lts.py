@@ -0,0 +1,273 @@
+import itertools
+import random
+
+import pytest
+
+from lts import StateMachine, Budget, BudgetExceeded, CSRTransitions, convert, find_violation, find_violations
+
+
+def random_machine(rng, n_states=6, n_events=4, n_transitions=15, error=False):
+    alphabet = [f"e{i}" for i in range(n_events)]
+    targets = list(range(n_states)) + ([-1] if error else [])
+    transitions = [
+        [rng.randrange(n_states), rng.randrange(n_events), rng.choice(targets)] for _ in range(n_transitions)
+    ]
+    return StateMachine("m", transitions, alphabet, set(rng.sample(range(n_states), n_states // 2)))
+
+
+def test_to_dfa_matches_fsm(tmp_path):
+    d = pytest.importorskip("DESops")
+    rng = random.Random(0)
+    for i in range(50):
+        m = random_machine(rng, error=i % 2 == 0)
+        c, o = m.alphabet[:2], m.alphabet[:3]
+        file = str(tmp_path / f"m{i}.fsm")
+        m.to_fsm(c, o, file)
+        expected = d.read_fsm(file)
+        g = m.to_dfa(c, o)
+
+        # state 0 is the initial vertex, also when the error state -1 is the smallest state
+        assert g.vs[0]["name"] == "State0"
+        assert len(g.vs) == len(expected.vs) and len(g.es) == len(expected.es)
+        assert set(map(str, g.Euc)) == set(map(str, expected.Euc))
+        assert set(map(str, g.Euo)) == set(map(str, expected.Euo))
+        assert d.compare_language(g, expected) and d.compare_language(expected, g)
+
+
+def test_next_state_into_error_state():
+    m = StateMachine("p", [[0, 0, -1], [0, 1, 1]], ["a", "b"])
+    assert m.next_state(0, "a") == -1
+    assert m.next_state(0, "b") == 1
+    assert m.next_state(1, "a") == None
+    assert m.next_state(-1, "a") == None
+    m.add_transition(1, 0, -1)
+    assert m.next_state(1, "a") == -1
+
+
+def visible_traces(machines, visible, depth):
+    """
+    The traces of the composition of the machines over the visible events, up to the given length, by brute
+    force: components synchronize on the events they use and the other events are hidden.
+    """
+    owners = {}
+    for i, m in enumerate(machines):
+        for t in m.transitions:
+            owners.setdefault(m.alphabet[t[1]], set()).add(i)
+
+    def successors(st):
+        for a, idx in owners.items():
+            targets = [[t[2] for t in machines[i].transitions if t[0] == st[i] and machines[i].alphabet[t[1]] == a]
+                       for i in range(len(machines))]
+            if all(len(targets[i]) > 0 for i in idx):
+                choices = [targets[i] if i in idx else [s] for i, s in enumerate(st)]
+                for nxt in itertools.product(*choices):
+                    yield a, nxt
+
+    def closure(states):
+        result, stack = set(states), list(states)
+        while len(stack) > 0:
+            for a, nxt in successors(stack.pop()):
+                if a not in visible and nxt not in result:
+                    result.add(nxt)
+                    stack.append(nxt)
+        return result
+
+    traces = set()
+    frontier = [((), closure({tuple(0 for _ in machines)}))]
+    for _ in range(depth + 1):
+        next_frontier = []
+        for trace, states in frontier:
+            traces.add(trace)
+            for a in visible:
+                nxt = set(t for st in states for b, t in successors(st) if b == a)
+                if len(nxt) > 0:
+                    next_frontier.append((trace + (a,), closure(nxt)))
+        frontier = next_frontier
+    return traces
+
+
+def test_find_violations_matches_brute_force():
+    rng = random.Random(1)
+    n_violations = 0
+    for _ in range(100):
+        machines = [random_machine(rng, n_states=3, n_transitions=6) for _ in range(2)]
+        preferred = [random_machine(rng, n_states=3, n_transitions=4) for _ in range(3)]
+        observable = ["e0", "e1", "e2"]
+        violations = find_violations(preferred, machines, observable)
+        used = set(a for m in machines for a in m.used_events()) & set(observable)
+        for p, trace in zip(preferred, violations):
+            # sharing the exploration does not change the result of each behavior
+            assert find_violation(p, machines, observable) == trace
+            visible = p.used_events() & used
+            expected = visible_traces(machines, visible, 4)
+            if trace == None:
+                assert visible_traces([p], visible, 4) <= expected
+            else:
+                n_violations += 1
+                # the counterexample is a trace of p that the composition cannot perform
+                assert tuple(trace) in visible_traces([p], p.used_events(), len(trace))
+                assert tuple(a for a in trace if a in visible) not in visible_traces(machines, visible, len(trace))
+    assert 0 < n_violations < 300
+
+
+def test_find_violations_budget():
+    # p is included, so the search explores the whole cycle unless it is stopped
+    cycle = StateMachine("m", [[i, 0, (i + 1) % 5] for i in range(5)], ["e0"])
+    p = StateMachine("p", [[0, 0, 0]], ["e0"])
+    assert find_violations([p], [cycle], ["e0"]) == [None]
+    with pytest.raises(BudgetExceeded):
+        find_violations([p], [cycle], ["e0"], Budget(max_states=2))
+
+
+def random_dfa(rng, n_states=8, n_events=3, error=False):
+    alphabet = [f"e{i}" for i in range(n_events)]
+    targets = list(range(n_states)) + ([-1] if error else [])
+    transitions = [[s, a, rng.choice(targets)] for s in range(n_states) for a in range(n_events) if rng.random() < 0.7]
+    return StateMachine("m", transitions, alphabet, set(rng.sample(range(n_states), n_states // 2)))
+
+
+def equivalent(m1, s1, m2, s2):
+    """
+    Whether the states s1 of m1 and s2 of m2 of deterministic machines generate and accept the same languages.
+    """
+    seen, stack = {(s1, s2)}, [(s1, s2)]
+    while len(stack) > 0:
+        s1, s2 = stack.pop()
+        if (s1 in m1.accept) != (s2 in m2.accept):
+            return False
+        for a in set(m1.alphabet) | set(m2.alphabet):
+            t1, t2 = m1.next_state(s1, a), m2.next_state(s2, a)
+            if (t1 == None) != (t2 == None):
+                return False
+            if t1 != None and (t1, t2) not in seen:
+                seen.add((t1, t2))
+                stack.append((t1, t2))
+    return True
+
+
+def test_minimize():
+    rng = random.Random(3)
+    for i in range(100):
+        m = random_dfa(rng, error=i % 2 == 0)
+        minimal = m.minimize()
+        assert equivalent(m, 0, minimal, 0)
+        states = sorted(minimal.all_states())
+        assert len(states) <= len(m.all_states())
+        # no two states of the result are equivalent
+        for j, s in enumerate(states):
+            for t in states[j + 1:]:
+                assert not equivalent(minimal, s, minimal, t)
+
+
+def test_minimize_merges_equivalent_states():
+    # states 1 and 2 both loop back to 0 on b
+    m = StateMachine("m", [[0, 0, 1], [0, 1, 2], [1, 1, 0], [2, 1, 0]], ["a", "b"], {0})
+    minimal = m.minimize()
+    assert len(minimal.all_states()) == 2
+    assert equivalent(m, 0, minimal, 0)
+    # nondeterministic machines are returned as is
+    n = StateMachine("n", [[0, 0, 1], [0, 0, 2]], ["a"])
+    assert n.minimize() is n
+
+
+def test_fsm_starts_with_initial_state(tmp_path):
+    # the first transition leaves state 1, but state 0 is still the initial state of the .fsm file
+    m = StateMachine("m", [[1, 1, 0], [0, 0, 1], [1, 0, -1]], ["a", "b"], {0})
+    lines = m.to_fsm(["a"], ["a", "b"]).split("\n")
+    assert lines[0] == "3" and lines[2] == "State0\t1\t1"
+    file = str(tmp_path / "m.fsm")
+    m.to_fsm(["a"], ["a", "b"], file)
+    n = StateMachine.from_fsm(file)
+    assert n.next_state(0, "a") == 1 and n.next_state(1, "b") == 0 and n.accept == {0}
+
+
+def test_binary_round_trip(tmp_path):
+    rng = random.Random(4)
+    for i in range(30):
+        m = random_machine(rng, error=i % 2 == 0)
+        file = str(tmp_path / f"m{i}.ltsb")
+        m.to_binary(file)
+        n = StateMachine.from_binary(file)
+        assert isinstance(n.transitions, CSRTransitions)
+        assert n.name == m.name and n.alphabet == m.alphabet and n.accept == m.accept
+        assert list(n.transitions) == sorted(m.transitions)
+        assert [n.transitions[j] for j in range(-len(m.transitions), 0)] == sorted(m.transitions)
+        for s in m.all_states():
+            for a in m.alphabet:
+                assert (n.next_state(s, a) == None) == (m.next_state(s, a) == None)
+        # the queries answered from the arrays agree with the indexed list of the same transitions
+        lists = StateMachine(m.name, sorted(m.transitions), m.alphabet, m.accept)
+        assert n.all_states() == lists.all_states()
+        assert n.to_fsm(m.alphabet[:1], m.alphabet) == lists.to_fsm(m.alphabet[:1], m.alphabet)
+
+    empty = StateMachine("empty", [], [])
+    empty.to_binary(str(tmp_path / "empty.ltsb"))
+    n = StateMachine.from_binary(str(tmp_path / "empty.ltsb"))
+    assert n.alphabet == [] and len(n.transitions) == 0 and n.all_states() == {0}
+
+
+def test_from_binary_rejects_other_files(tmp_path):
+    file = tmp_path / "m.ltsb"
+    file.write_bytes(b"LTS")
+    with pytest.raises(ValueError):
+        StateMachine.from_binary(str(file))
+    file.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        StateMachine.from_binary(str(file))
+
+
+def test_fsm_round_trip(tmp_path):
+    rng = random.Random(5)
+    for i in range(30):
+        m = random_dfa(rng, error=i % 2 == 0)
+        file = str(tmp_path / f"m{i}.fsm")
+        m.to_fsm(m.alphabet[:1], m.alphabet, file)
+        n = StateMachine.from_fsm(file, m.alphabet)
+        assert n.alphabet == ["_tau_"] + m.alphabet
+        assert equivalent(m, 0, n, 0)
+        # streaming into a file and building the string give the same output
+        with open(file) as f:
+            assert f.read() == m.to_fsm(m.alphabet[:1], m.alphabet)
+
+
+def test_convert(tmp_path):
+    m = random_dfa(random.Random(6))
+    fsm, ltsb, json_file = (str(tmp_path / f"m.{ext}") for ext in ["fsm", "ltsb", "json"])
+    m.to_fsm([], m.alphabet, fsm)
+    convert(fsm, ltsb)
+    assert equivalent(m, 0, StateMachine.from_binary(ltsb), 0)
+    convert(ltsb, json_file)
+    n = StateMachine.from_json(json_file)
+    assert n.transitions == list(StateMachine.from_binary(ltsb).transitions)
+    # .json does not store the accepting states, so all of them are accepting
+    assert n.accept == n.all_states()
+    with pytest.raises(AssertionError):
+        convert(ltsb, str(tmp_path / "n.fsm"))
+
+
+def test_binary_queries_do_not_copy(tmp_path):
+    import tracemalloc
+
+    # 200 states with 1000 transitions each
+    n_states, n_events = 200, 1000
+    alphabet = [f"e{i}" for i in range(n_events)]
+    transitions = [[s, a, (s + a) % n_states] for s in range(n_states) for a in range(n_events)]
+    file = str(tmp_path / "big.ltsb")
+    StateMachine("big", transitions, alphabet, {0}).to_binary(file)
+    del transitions
+
+    tracemalloc.start()
+    try:
+        m = StateMachine.from_binary(file)
+        start = tracemalloc.get_traced_memory()[0]
+        assert m.next_state(3, "e7") == 10
+        assert m.next_state(3, "x") == None and m.next_state(n_states, "e0") == None
+        assert m.all_states() == frozenset(range(n_states))
+        out = m.out_trans()
+        assert len(out) == n_states and len(out[5]) == n_events and out[5][-1] == [5, n_events - 1, (5 + n_events - 1) % n_states]
+        assert out.get(n_states) == None
+        # the transitions are never copied into lists, only the states are
+        assert tracemalloc.get_traced_memory()[0] - start < 200_000
+    finally:
+        tracemalloc.stop()
+    assert m._table == None and isinstance(m.transitions, CSRTransitions)
@@ -0,0 +1,80 @@
+import itertools
+import json
+
+import pytest
+
+pytest.importorskip("DESops")
+
+from repair import Repair, PRIORITY0, PRIORITY1, PRIORITY2, PRIORITY3
+
+
+def write_model(dir, name, alphabet, transitions):
+    file = str(dir / f"{name}.json")
+    with open(file, "w") as f:
+        json.dump({"process": name.upper(), "alphabet": alphabet, "transitions": transitions}, f)
+    return file
+
+
+def small_problem(dir):
+    # b is unsafe right after a, and the preferred behavior needs a and c
+    alphabet = ["a", "b", "c"]
+    return {
+        "sys": [write_model(dir, "m", alphabet, [[0, 0, 1], [1, 1, 0], [1, 2, 0], [0, 2, 0]])],
+        "env_p": [write_model(dir, "env", alphabet, [[0, 0, 0], [0, 1, 0], [0, 2, 0]])],
+        "safety": [write_model(dir, "p", alphabet, [[0, 0, 1], [0, 1, 0], [0, 2, 0], [1, 0, 1], [1, 1, -1], [1, 2, 0]])],
+        "preferred": {
+            PRIORITY3: [write_model(dir, "ac", ["a", "c"], [[0, 0, 1], [1, 1, 0]])],
+            PRIORITY2: [write_model(dir, "c", ["c"], [[0, 0, 0]])],
+            PRIORITY1: [],
+            PRIORITY0: []
+        },
+        "progress": [],
+        "alphabet": alphabet,
+        "controllable": {PRIORITY3: [], PRIORITY2: ["a"], PRIORITY1: ["b", "c"], PRIORITY0: []},
+        "observable": {PRIORITY3: [], PRIORITY2: ["a"], PRIORITY1: ["b"], PRIORITY0: ["c"]}
+    }
+
+
+def summary(results):
+    return [
+        (sorted(r["controllable"]), sorted(r["observable"]), sorted(r["preferred"]), r["cost"])
+        for r in results
+    ]
+
+
+def test_incremental_synthesis_gives_the_same_results(tmp_path):
+    problem = small_problem(tmp_path)
+    results = {}
+    for incremental in [True, False]:
+        r = Repair(**problem, incremental=incremental, cache_dir=None, load_workers=1, persistent_helper=False,
+                   work_dir=str(tmp_path / f"work_{incremental}"))
+        try:
+            results[incremental] = summary(r.synthesize(5))
+        finally:
+            r.close()
+    assert len(results[True]) > 0
+    assert results[True] == results[False]
+
+
+def test_next_least_to_remove_enumerates_brackets_in_tier_order(tmp_path):
+    problem = small_problem(tmp_path)
+    problem["preferred"] = {PRIORITY3: ["e1", "e2"], PRIORITY2: ["i1"], PRIORITY1: ["m1", "m2", "never"], PRIORITY0: []}
+    r = Repair(**problem, cache_dir=None, load_workers=1, persistent_helper=False, work_dir=str(tmp_path / "work"))
+    try:
+        # "never" is not fulfilled by the initial controller, so it is never removed
+        tiers = [["e1", "e2"], ["i1"], ["m1", "m2"]]
+        counts = []
+        for bracket in r.next_least_to_remove(set(tiers[0] + tiers[1] + tiers[2])):
+            n = tuple(len([d for d in bracket[0] if d in tier]) for tier in tiers)
+            counts.append(n)
+            expected = set(
+                frozenset(l + m + o) for l, m, o in itertools.product(
+                    *[itertools.combinations(tier, k) for tier, k in zip(tiers, n)]
+                )
+            )
+            assert len(bracket) == len(expected)
+            assert set(map(frozenset, bracket)) == expected
+        # Essential, then Important, then Minor behavior, lexicographically
+        assert counts == list(itertools.product(range(3), range(2), range(3)))
+    finally:
+        r.close()